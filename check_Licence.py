@@ -1,8 +1,31 @@
-import requests
-import csv
-import datetime
-import uuid
 import getpass
+import os
+import sys
+
+# The verification core is shared with the server-side verifier
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BASE_DIR, "server", "scripts"))
+from license_core import LicenseVerifierCore, compile_check_plan, run_check_plan, summarize_checks
+
+# Default allowed countries when a license does not list any
+DEFAULT_ALLOWED_COUNTRIES = ("MY", "US", "IN")
+
+_core = None
+
+def get_core():
+    """
+    Returns the shared verification core, created on first use.
+    
+    Returns:
+        LicenseVerifierCore: Core using this directory's cache and country_codes.csv
+    """
+    global _core
+    if _core is None:
+        _core = LicenseVerifierCore(
+            cache_dir=os.path.join(BASE_DIR, "cache"),
+            country_codes_path=os.path.join(BASE_DIR, "country_codes.csv")
+        )
+    return _core
 
 def check_country(allowed_countries=None):
     """
@@ -15,49 +38,9 @@ def check_country(allowed_countries=None):
     Returns:
         tuple: (is_valid: bool, message: str)
     """
-    # Read country codes CSV
-    reader = csv.reader(open('country_codes.csv', 'r'))
-    cnames = {}
-    for row in reader:
-        k, v = row[0], row[1]  # country name, country code
-        cnames[v] = k  # Use code as key, name as value
-    
-    flag = True
-    msg = "Licence is Valid"
-    
-    # Default allowed countries if none provided
     if allowed_countries is None:
-        allowed_countries = ("MY", "US", "IN")
-        
-    try:
-        # Get public IP address and country from ipinfo.io API
-        response = requests.get('https://ipinfo.io/json', timeout=5)
-        data = response.json()
-        
-        # Extract country code from response
-        country = data.get('country', 'Unknown')
-        
-        # Get additional location info for reporting
-        city = data.get('city', 'Unknown')
-        region = data.get('region', 'Unknown')
-        ip = data.get('ip', 'Unknown')
-        
-        print(f"Detected location: {city}, {region}, {cnames.get(country, country)} (Code: {country})")
-        print(f"Public IP: {ip}")
-        
-        if country not in allowed_countries:
-            msg = f"This software does not work in {cnames.get(country, country)} (Code: {country})"
-            flag = False
-        return flag, msg
-        
-    except requests.RequestException as e:
-        msg = f"Cannot determine country: Network error: {str(e)}"
-        flag = False
-        return flag, msg
-    except Exception as e:
-        msg = f"Internal system error while checking country: {str(e)}"
-        flag = False
-        return flag, msg
+        allowed_countries = DEFAULT_ALLOWED_COUNTRIES
+    return get_core().check_country('DEFAULT', list(allowed_countries))
 
 def get_system_mac():
     """
@@ -66,9 +49,7 @@ def get_system_mac():
     Returns:
         str: MAC address in uppercase, colon-separated format
     """
-    mac = ':'.join(['{:02X}'.format((uuid.getnode() >> ele) & 0xff)
-                 for ele in range(0,8*6,8)][::-1])
-    return mac
+    return get_core().get_system_mac()
 
 def Check_Date(expiry_date):
     """
@@ -81,22 +62,7 @@ def Check_Date(expiry_date):
     Returns:
         tuple: (is_valid: bool, message: str)
     """
-    today = datetime.date.today()
-    try:
-        expiry = datetime.datetime.strptime(expiry_date, "%Y-%m-%d").date()
-        
-        # Calculate days until expiry
-        days_until_expiry = (expiry - today).days
-        
-        if days_until_expiry < 0:
-            return False, "License has expired."
-        elif days_until_expiry <= 30:
-            return True, f"License is valid but expires in {days_until_expiry} days. Please renew soon."
-        else:
-            return True, f"License is valid. Expires in {days_until_expiry} days."
-            
-    except Exception as e:
-        return False, f"Date check error: {e}"
+    return get_core().check_expiry('DEFAULT', expiry_date)
 
 def Check_MAC(allowed_macs):
     """
@@ -108,17 +74,7 @@ def Check_MAC(allowed_macs):
     Returns:
         tuple: (is_valid: bool, message: str)
     """
-    # Get current system's MAC address
-    current_mac = get_system_mac()
-    print(f"Current MAC address: {current_mac}")
-    
-    if not allowed_macs:
-        return False, "No allowed MAC addresses specified"
-        
-    if current_mac in allowed_macs:
-        return True, "MAC address is allowed"
-    else:
-        return False, f"This license is not valid for this device (MAC: {current_mac})"
+    return get_core().check_mac('DEFAULT', allowed_macs)
 
 def Check_User_Count(license_key, new_user=False):
     """
@@ -131,41 +87,7 @@ def Check_User_Count(license_key, new_user=False):
     Returns:
         tuple: (is_valid: bool, message: str)
     """
-    try:
-        # Get maximum allowed users for this license
-        max_users = get_max_users_for_license(license_key)
-        
-        # Store user count in a simple file (simulating database storage)
-        # In production, this would be a database query
-        user_count_file = f"user_count_{license_key}.txt"
-        
-        # Get current user count from storage
-        try:
-            with open(user_count_file, 'r') as f:
-                current_users = int(f.read().strip())
-        except FileNotFoundError:
-            # If file doesn't exist, initialize user count to 0
-            current_users = 0
-        
-        # If adding a new user, check if it would exceed the limit
-        if new_user:
-            if current_users >= max_users:
-                return False, f"User count limit reached ({current_users}/{max_users}). Cannot add new user."
-            else:
-                # Increment user count and save
-                current_users += 1
-                with open(user_count_file, 'w') as f:
-                    f.write(str(current_users))
-                return True, f"New user added. Current user count: {current_users}/{max_users}"
-        else:
-            # Just checking current status
-            if current_users >= max_users:
-                return False, f"User count limit reached ({current_users}/{max_users})."
-            else:
-                return True, f"User count is within allowed limit ({current_users}/{max_users})."
-    
-    except Exception as e:
-        return False, f"Error checking user count: {str(e)}"
+    return get_core().check_user_count(license_key, get_max_users_for_license(license_key), new_user)
 
 # Helper function to get max users from license
 def get_max_users_for_license(license_key):
@@ -217,55 +139,52 @@ def check_license(license_data, adding_new_user=False):
             - allowed_countries: List of allowed country codes
             - expiry_date: License expiry date (YYYY-MM-DD)
             - allowed_macs: List of allowed MAC addresses
+            - max_users: Maximum allowed users (looked up by key if absent)
+            - license_type: date_based, user_count_based, mac_based,
+              country_based or mixed (default); only its checks run
         adding_new_user: Whether this check is for adding a new user
     
     Returns:
         tuple: (is_valid: bool, message: str, details: dict)
     """
-    results = {}
-    is_valid = True
-    messages = []
-    
-    # Country check - automatically gets current country
-    country_flag, country_msg = check_country(license_data.get('allowed_countries'))
-    results['country'] = {'valid': country_flag, 'message': country_msg}
-    if not country_flag:
-        is_valid = False
-        messages.append(country_msg)
-    
-    # Date check
-    date_flag, date_msg = Check_Date(license_data.get('expiry_date', '2099-12-31'))
-    results['date'] = {'valid': date_flag, 'message': date_msg}
-    if not date_flag:
-        is_valid = False
-        messages.append(date_msg)
-    else:
-        # Add warning message if close to expiry
-        if "expires in" in date_msg and "Please renew soon" in date_msg:
-            messages.append(date_msg)
-    
-    # MAC check - automatically gets current MAC
-    mac_flag, mac_msg = Check_MAC(license_data.get('allowed_macs', []))
-    results['mac'] = {'valid': mac_flag, 'message': mac_msg}
-    if not mac_flag:
-        is_valid = False
-        messages.append(mac_msg)
-    
-    # User count check - will increment count if adding_new_user is True
     license_key = license_data.get('license_key', 'DEFAULT')
-    user_flag, user_msg = Check_User_Count(license_key, adding_new_user)
-    results['user_count'] = {'valid': user_flag, 'message': user_msg}
-    if not user_flag:
-        is_valid = False
-        messages.append(user_msg)
+    plan = compile_check_plan(license_data.get('license_type'))
+    core = get_core()
+    # Only a missing list falls back to the defaults; an empty one allows nothing
+    allowed_countries = license_data.get('allowed_countries')
+    if allowed_countries is None:
+        allowed_countries = DEFAULT_ALLOWED_COUNTRIES
+    details = {
+        'allowed_countries': list(allowed_countries),
+        'allowed_macs': license_data.get('allowed_macs', []),
+        'expiry_date': license_data.get('expiry_date', '2099-12-31'),
+    }
+    if 'user_count' in plan.checks:
+        details['max_users'] = license_data.get('max_users') or get_max_users_for_license(license_key)
+    
+    # Each check runs in the shared core; the user count check increments
+    # the count if adding_new_user is True
+    checks = run_check_plan(plan, {
+        name: (lambda name=name: core.run_check(name, license_key, details, adding_new_user))
+        for name in plan.checks
+    })
+    
+    # Results keep this module's historical 'date' name for the expiry check
+    results = {('date' if name == 'expiry' else name): check for name, check in checks.items()}
+    for name in plan.skipped:
+        results['date' if name == 'expiry' else name] = {
+            'valid': True,
+            'skipped': True,
+            'message': f"Not required for {plan.license_type} licenses"
+        }
     
     # Create overall message
-    if is_valid:
-        overall_message = "License is valid and active for this system."
-        if messages:  # If there are warning messages but license is still valid
-            overall_message += " However: " + "; ".join(messages)
-    else:
-        overall_message = "License validation failed: " + "; ".join(messages)
+    is_valid, overall_message = summarize_checks(
+        checks,
+        success_message="License is valid and active for this system.",
+        failure_message="License validation failed: ",
+        notice_prefix=" However: "
+    )
     
     return is_valid, overall_message, results
 
@@ -279,7 +198,8 @@ if __name__ == "__main__":
         'license_key': 'ABC-DEF-GHI-JKL',
         'allowed_countries': ["IN", "US", "MY"],
         'expiry_date': "2025-12-31",
-        'allowed_macs': [get_system_mac()]
+        'allowed_macs': [get_system_mac()],
+        'license_type': 'mixed'
     }
     
     # Test just checking user count (without adding)
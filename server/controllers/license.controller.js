@@ -3,6 +3,7 @@ const License = db.licenses;
 const Customer = db.customers;
 const LicenseAllowedCountry = db.licenseAllowedCountries;
 const LicenseMacAddress = db.licenseMacAddresses;
+const LicenseTombstone = db.licenseTombstones;
 const { Op } = require("sequelize");
 const crypto = require('crypto');
 
@@ -149,6 +150,78 @@ exports.findAll = async (req, res) => {
   }
 };
 
+// Retrieve licenses changed since a high-water mark, plus deletions
+exports.findChanges = async (req, res) => {
+  try {
+    let since = null;
+    if (req.query.since) {
+      since = new Date(req.query.since);
+      if (isNaN(since.getTime())) {
+        return res.status(400).json({
+          message: "since must be an ISO 8601 timestamp"
+        });
+      }
+    }
+
+    // Fix the upper bound before querying so the next sync starts exactly
+    // where this one stopped
+    const until = new Date();
+    const changeWindow = since ? { [Op.gt]: since, [Op.lte]: until } : { [Op.lte]: until };
+
+    const changed = await License.findAll({
+      where: { updated_at: changeWindow },
+      include: [
+        {
+          model: LicenseAllowedCountry,
+          as: "allowed_countries",
+          attributes: ["country_code"]
+        },
+        {
+          model: LicenseMacAddress,
+          as: "mac_addresses",
+          attributes: ["mac_address"]
+        }
+      ],
+      order: [["updated_at", "ASC"]]
+    });
+
+    // A full sync has nothing to delete
+    const deleted = since ? await LicenseTombstone.findAll({
+      where: { deleted_at: changeWindow },
+      order: [["deleted_at", "ASC"]]
+    }) : [];
+
+    return res.json({
+      since: since,
+      until: until,
+      licenses: changed.map(license => {
+        const plainLicense = license.get({ plain: true });
+        return {
+          id: plainLicense.id,
+          license_key: plainLicense.license_key,
+          license_type: plainLicense.license_type,
+          license_scope: plainLicense.license_scope,
+          expiry_date: plainLicense.expiry_date,
+          grace_period_days: plainLicense.grace_period_days,
+          max_users_allowed: plainLicense.max_users_allowed,
+          updated_at: plainLicense.updated_at,
+          allowed_countries: plainLicense.allowed_countries.map(country => country.country_code),
+          mac_addresses: plainLicense.mac_addresses.map(mac => mac.mac_address)
+        };
+      }),
+      deleted: deleted.map(tombstone => ({
+        id: tombstone.license_id,
+        license_key: tombstone.license_key,
+        deleted_at: tombstone.deleted_at
+      }))
+    });
+  } catch (err) {
+    return res.status(500).json({
+      message: err.message || "Some error occurred while retrieving license changes."
+    });
+  }
+};
+
 // Find a single License with an id
 exports.findOne = async (req, res) => {
   const id = req.params.id;
@@ -239,6 +312,10 @@ exports.update = async (req, res) => {
     if (req.body.max_users_allowed !== undefined) updateData.max_users_allowed = req.body.max_users_allowed;
     if (req.body.current_users !== undefined) updateData.current_users = req.body.current_users;
     
+    // Country and MAC changes only touch child rows, so mark the license
+    // itself as changed for incremental sync
+    if (req.body.mac_addresses || req.body.allowed_countries) updateData.updated_at = new Date();
+    
     const num = await License.update(updateData, {
       where: { id: id },
       transaction: t
@@ -315,6 +392,8 @@ exports.delete = async (req, res) => {
   const t = await db.sequelize.transaction();
 
   try {
+    const license = await License.findByPk(id, { transaction: t });
+    
     // Delete associated MAC addresses
     await LicenseMacAddress.destroy({
       where: { license_id: id },
@@ -334,6 +413,12 @@ exports.delete = async (req, res) => {
     });
 
     if (num == 1) {
+      // Record the deletion so incremental sync clients can drop the license
+      await LicenseTombstone.create({
+        license_id: id,
+        license_key: license ? license.license_key : null
+      }, { transaction: t });
+      
       await t.commit();
       return res.json({
         message: "License was deleted successfully!"
@@ -715,6 +800,13 @@ exports.generateLicenseKey = async (req, res) => {
       await db.licenseAllowedCountries.bulkCreate(countries);
     }
     
+    // Child rows were added after the license row; bump it so a sync that ran
+    // in between picks up the countries and MAC addresses
+    if ((req.body.macAddresses && req.body.macAddresses.length > 0) ||
+        (req.body.allowedCountries && req.body.allowedCountries.length > 0)) {
+      await License.update({ updated_at: new Date() }, { where: { id: newLicense.id } });
+    }
+    
     return res.status(201).json({
       id: newLicense.id,
       licenseKey,
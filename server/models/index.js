@@ -28,6 +28,7 @@ db.licenses = require("./license.model.js")(sequelize, DataTypes);
 db.licenseVerificationLogs = require("./licenseVerificationLog.model.js")(sequelize, DataTypes);
 db.licenseAllowedCountries = require("./licenseAllowedCountry.model.js")(sequelize, DataTypes);
 db.licenseMacAddresses = require("./licenseMacAddress.model.js")(sequelize, DataTypes);
+db.licenseTombstones = require("./licenseTombstone.model.js")(sequelize, DataTypes);
 db.users = require("./user.model.js")(sequelize, DataTypes);
 
 // Define relationships
@@ -66,7 +66,11 @@ module.exports = (sequelize, DataTypes) => {
     }
   }, {
     timestamps: true,
-    underscored: true
+    underscored: true,
+    indexes: [
+      // Incremental sync reads licenses changed after a high-water mark
+      { fields: ["updated_at"] }
+    ]
   });
 
   return License;
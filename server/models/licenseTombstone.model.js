@@ -0,0 +1,29 @@
+module.exports = (sequelize, DataTypes) => {
+  const LicenseTombstone = sequelize.define("license_tombstone", {
+    id: {
+      type: DataTypes.UUID,
+      defaultValue: DataTypes.UUIDV4,
+      primaryKey: true
+    },
+    license_id: {
+      type: DataTypes.UUID,
+      allowNull: false
+    },
+    license_key: {
+      type: DataTypes.STRING,
+      allowNull: true
+    },
+    deleted_at: {
+      type: DataTypes.DATE,
+      defaultValue: DataTypes.NOW
+    }
+  }, {
+    timestamps: true,
+    underscored: true,
+    indexes: [
+      { fields: ["deleted_at"] }
+    ]
+  });
+
+  return LicenseTombstone;
+};
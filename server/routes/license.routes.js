@@ -3,6 +3,8 @@ const express = require('express');
 const router = express.Router();
 const { spawn } = require('child_process');
 const path = require('path');
+const fs = require('fs');
+const crypto = require('crypto');
 
 module.exports = app => {
   const licenses = require("../controllers/license.controller.js");
@@ -13,6 +15,9 @@ module.exports = app => {
   // Retrieve all Licenses
   router.get("/", licenses.findAll);
 
+  // Licenses changed since a high-water mark (registered before /:id)
+  router.get("/changes", licenses.findChanges);
+
   // Retrieve a single License with id
   router.get("/:id", licenses.findOne);
 
@@ -22,8 +27,13 @@ module.exports = app => {
   // Delete a License with id
   router.delete("/:id", licenses.delete);
   
-  // Verify a License
-  router.post("/verify", licenses.verifyLicense);
+  // Verify a License: by key through the Python verifier, by id through the controller
+  router.post("/verify", (req, res, next) => {
+    if (req.body.licenseKey && !req.body.licenseId) {
+      return verifyLicenseKey(req, res);
+    }
+    return licenses.verifyLicense(req, res, next);
+  });
   
   // Update user count for a license
   router.put("/:id/user-count", licenses.updateUserCount);
@@ -88,8 +98,8 @@ module.exports = app => {
     }
   });
 
-  // License verification API endpoint
-  router.post('/verify', async (req, res) => {
+  // License verification by key, backed by the Python verifier
+  async function verifyLicenseKey(req, res) {
     try {
       const { licenseKey } = req.body;
       
@@ -101,10 +111,36 @@ module.exports = app => {
         });
       }
 
+      // Fast path: a still-valid receipt from an earlier verification
+      if (req.body.receipt) {
+        const receipt = validateReceipt(req.body.receipt, licenseKey);
+        if (receipt && receipt.accepted) {
+          return res.json({
+            valid: receipt.claims.ok,
+            status: receipt.claims.ok ? 'valid' : 'invalid',
+            message: `License verification ${receipt.claims.ok ? 'successful' : 'failed'} (from receipt)`,
+            details: {
+              license_key: licenseKey,
+              // Same shape as a full verification and verify_license.py's receipt path
+              checks: Object.fromEntries(
+                Object.entries(receipt.claims.checks).map(([name, valid]) => [name, { valid }])
+              ),
+              verification_token: req.body.receipt,
+              verification_token_expires: new Date(receipt.claims.exp * 1000).toISOString(),
+              verification_time: new Date(receipt.claims.iat * 1000).toISOString()
+            }
+          });
+        }
+        // Rejected or unverifiable receipts fall back to a full verification
+      }
+
       // Two implementation options:
       
       // Option 1: Call Python script (recommended for complex verification)
-      const result = await callPythonVerifier(licenseKey);
+      const result = await verifyCoalesced(licenseKey, req.ip);
+      if (result.status === 'throttled') {
+        return res.status(429).json(result);
+      }
       return res.json(result);
       
       // Option 2: Use built-in JS verification (simpler but less powerful)
@@ -119,13 +155,102 @@ module.exports = app => {
         details: { error: error.message }
       });
     }
-  });
+  }
+
+  // Cache directory of the Python verifier, resolved the same way it does
+  function verifierCacheDir() {
+    return process.env.LICENSE_CACHE_DIR || path.join(__dirname, '..', 'scripts', 'cache');
+  }
+
+  // Receipt signing key shared with the Python verifier
+  let receiptSecret = process.env.LICENSE_RECEIPT_SECRET || null;
+
+  function loadReceiptSecret() {
+    if (!receiptSecret) {
+      try {
+        const secretFile = path.join(verifierCacheDir(), 'receipt.key');
+        receiptSecret = fs.readFileSync(secretFile, 'utf8').trim();
+      } catch (err) {
+        // Not created until the verifier issues its first receipt
+        return null;
+      }
+    }
+    return receiptSecret;
+  }
+
+  // This host's fingerprint digest, as last recorded by the verifier in its
+  // state snapshot (header "VKSS", format 1, index length, JSON index, blobs).
+  // Null when there is no fresh fingerprint, so the caller re-verifies.
+  function verifierFingerprint() {
+    try {
+      const snap = fs.readFileSync(path.join(verifierCacheDir(), 'verifier_state.snap'));
+      if (snap.toString('latin1', 0, 4) !== 'VKSS' || snap.readUInt16LE(4) !== 1) {
+        return null;
+      }
+      const dataOffset = 10 + snap.readUInt32LE(6);
+      const entry = JSON.parse(snap.toString('utf8', 10, dataOffset)).fingerprint;
+      const ttl = Number(process.env.LICENSE_FINGERPRINT_TTL || 300);
+      if (!entry || entry.stored_at + ttl < Date.now() / 1000) {
+        return null;
+      }
+      const start = dataOffset + entry.offset;
+      return JSON.parse(snap.toString('utf8', start, start + entry.length)).digest || null;
+    } catch (err) {
+      return null;
+    }
+  }
+
+  // Validate a signed receipt issued by verify_license.py without re-running any checks
+  function validateReceipt(receipt, licenseKey) {
+    const secret = loadReceiptSecret();
+    const fingerprint = verifierFingerprint();
+    if (!secret || !fingerprint || typeof receipt !== 'string') {
+      return null;
+    }
+
+    const [payload, signature] = receipt.split('.');
+    if (!payload || !signature) {
+      return { accepted: false, reason: 'Malformed receipt' };
+    }
+
+    const expected = crypto.createHmac('sha256', secret).update(payload).digest();
+    const given = Buffer.from(signature, 'base64url');
+    if (given.length !== expected.length || !crypto.timingSafeEqual(given, expected)) {
+      return { accepted: false, reason: 'Receipt signature is invalid' };
+    }
+
+    let claims;
+    try {
+      claims = JSON.parse(Buffer.from(payload, 'base64url').toString('utf8'));
+    } catch (err) {
+      return { accepted: false, reason: 'Malformed receipt' };
+    }
+
+    if (claims.ver !== 1) {
+      return { accepted: false, reason: 'Unsupported receipt version' };
+    }
+    if (claims.exp < Date.now() / 1000) {
+      return { accepted: false, reason: 'Receipt has expired' };
+    }
+    if (claims.key !== licenseKey) {
+      return { accepted: false, reason: 'Receipt was issued for a different license' };
+    }
+    if (claims.fp !== fingerprint) {
+      return { accepted: false, reason: 'Receipt was issued for a different device' };
+    }
+    return { accepted: true, claims };
+  }
 
   // Call Python script for verification
-  async function callPythonVerifier(licenseKey, addUser = false) {
+  async function callPythonVerifier(licenseKey, addUser = false, clientIp = null) {
     return new Promise((resolve, reject) => {
       const pythonScript = path.join(__dirname, '..', 'scripts', 'verify_license.py');
-      const pythonProcess = spawn('python', [pythonScript, licenseKey, addUser ? 'add-user' : 'verify']);
+      const args = [pythonScript, licenseKey, addUser ? 'add-user' : 'verify'];
+      if (clientIp) {
+        // Lets the verifier throttle per caller as well as per key
+        args.push(clientIp);
+      }
+      const pythonProcess = spawn('python', args);
       
       let resultData = '';
       let errorData = '';
@@ -155,6 +280,152 @@ module.exports = app => {
     });
   }
 
+  // Single-flight state for Python verifications. Read-only verifications of
+  // the same key that overlap share one script run, whoever sends them: the
+  // verifier fingerprints this host, not the caller, so the key identifies
+  // identical requests. The run charges the first caller's IP; callers that
+  // join it are charged against a per-IP bucket here instead.
+  const inFlightVerifications = new Map();
+  const addUserQueues = new Map();
+  const coalescingStats = {
+    verifyCalls: 0,
+    verifyExecutions: 0,
+    verifyCoalesced: 0,
+    verifyJoinThrottled: 0,
+    addUserCalls: 0,
+    addUserQueued: 0
+  };
+
+  // Per-caller allowance for joiners. Node does not know the license tier,
+  // so it uses the most generous client limit of the verifier's tiers, with
+  // LICENSE_RATE_LIMITS applied per tier as the verifier applies it.
+  const joinLimit = loadJoinLimit();
+  const joinBuckets = new Map();
+  const JOIN_BUCKET_IDLE_MS = 60 * 60 * 1000;
+  let joinBucketsSweptAt = Date.now();
+
+  function loadJoinLimit() {
+    const tiers = {
+      Premium: { client_per_minute: 240, burst: 20 },
+      Standard: { client_per_minute: 120, burst: 10 },
+      Basic: { client_per_minute: 60, burst: 5 }
+    };
+    if (process.env.LICENSE_RATE_LIMITS) {
+      try {
+        const override = JSON.parse(process.env.LICENSE_RATE_LIMITS);
+        for (const tier of Object.keys(override)) {
+          tiers[tier] = Object.assign({}, tiers[tier] || tiers.Basic, override[tier]);
+        }
+      } catch (err) {
+        console.error("Ignoring invalid LICENSE_RATE_LIMITS:", err.message);
+      }
+    }
+    const limits = Object.values(tiers);
+    return {
+      perMinute: Math.max(...limits.map(tier => Number(tier.client_per_minute) || 0)),
+      burst: Math.max(...limits.map(tier => Number(tier.burst) || 0))
+    };
+  }
+
+  // Take one token from a caller's join bucket; returns seconds until one is
+  // available, or 0 if it was taken
+  function takeJoinToken(clientIp) {
+    const now = Date.now();
+    if (now - joinBucketsSweptAt > JOIN_BUCKET_IDLE_MS) {
+      for (const [ip, bucket] of joinBuckets) {
+        if (now - bucket.updated > JOIN_BUCKET_IDLE_MS) {
+          joinBuckets.delete(ip);
+        }
+      }
+      joinBucketsSweptAt = now;
+    }
+
+    const bucket = joinBuckets.get(clientIp) || { tokens: joinLimit.burst, updated: now };
+    const rate = joinLimit.perMinute / 60000;
+    bucket.tokens = Math.min(joinLimit.burst, bucket.tokens + (now - bucket.updated) * rate);
+    bucket.updated = now;
+    joinBuckets.set(clientIp, bucket);
+    if (bucket.tokens >= 1) {
+      bucket.tokens -= 1;
+      return 0;
+    }
+    return rate ? (1 - bucket.tokens) / rate / 1000 : 60;
+  }
+
+  function verifyCoalesced(licenseKey, clientIp) {
+    coalescingStats.verifyCalls++;
+
+    const inFlight = inFlightVerifications.get(licenseKey);
+    if (inFlight) {
+      const retryAfter = clientIp ? takeJoinToken(clientIp) : 0;
+      if (retryAfter) {
+        coalescingStats.verifyJoinThrottled++;
+        return Promise.resolve({
+          valid: false,
+          status: 'throttled',
+          message: "Verification rate limit exceeded",
+          details: {
+            license_key: licenseKey,
+            status: 'throttled',
+            error: `Too many verifications from ${clientIp}`,
+            retry_after: Math.round(retryAfter * 1000) / 1000
+          }
+        });
+      }
+      coalescingStats.verifyCoalesced++;
+      // A throttled run only speaks for the caller that spent the token;
+      // joiners get their own run and their own throttling decision
+      return inFlight.then(result => {
+        if (result.status !== 'throttled') {
+          return result;
+        }
+        coalescingStats.verifyExecutions++;
+        return callPythonVerifier(licenseKey, false, clientIp);
+      });
+    }
+
+    coalescingStats.verifyExecutions++;
+    const flight = callPythonVerifier(licenseKey, false, clientIp)
+      .finally(() => inFlightVerifications.delete(licenseKey));
+    inFlightVerifications.set(licenseKey, flight);
+    return flight;
+  }
+
+  // add-user changes the seat count, so it is never coalesced and runs
+  // strictly after any earlier add-user for the same license
+  function addUserSerialized(licenseKey, clientIp) {
+    coalescingStats.addUserCalls++;
+
+    const previous = addUserQueues.get(licenseKey);
+    if (previous) {
+      coalescingStats.addUserQueued++;
+    }
+
+    const run = (previous || Promise.resolve())
+      .catch(() => {})
+      .then(() => callPythonVerifier(licenseKey, true, clientIp));
+    addUserQueues.set(licenseKey, run);
+    run.finally(() => {
+      if (addUserQueues.get(licenseKey) === run) {
+        addUserQueues.delete(licenseKey);
+      }
+    }).catch(() => {});
+    return run;
+  }
+
+  // Coalescing statistics for the Python verification path
+  router.get('/verify/stats', (req, res) => {
+    res.json({
+      ...coalescingStats,
+      verifyInFlight: inFlightVerifications.size,
+      joinBuckets: joinBuckets.size,
+      addUserPendingLicenses: addUserQueues.size,
+      coalescingRatio: coalescingStats.verifyCalls
+        ? coalescingStats.verifyCoalesced / coalescingStats.verifyCalls
+        : 0
+    });
+  });
+
   // Add endpoint to add a user (increment user count)
   router.post('/add-user', async (req, res) => {
     try {
@@ -167,10 +438,10 @@ module.exports = app => {
         });
       }
       
-      // Call Python script with add-user flag
-      const result = await callPythonVerifier(licenseKey, true);
+      // Call Python script with add-user flag, one at a time per license
+      const result = await addUserSerialized(licenseKey, req.ip);
       
-      return res.json({
+      return res.status(result.status === 'throttled' ? 429 : 200).json({
         success: result.valid,
         message: result.message,
         details: result.details
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+import csv
+from typing import Dict, Iterator, List, Sequence
+
+DEFAULT_CHUNK_SIZE = 500_000
+
+
+def resolve_columns(header: Sequence[str], wanted: Dict[str, Sequence[str]],
+                    optional: Sequence[str] = ()) -> Dict[str, int]:
+    """Map logical column names to header positions using accepted aliases
+
+    Columns named in optional are left out when the header lacks them.
+    """
+    normalized = [h.strip().lower() for h in header]
+    positions = {}
+    for name, aliases in wanted.items():
+        for alias in aliases:
+            if alias in normalized:
+                positions[name] = normalized.index(alias)
+                break
+        else:
+            if name in optional:
+                continue
+            raise ValueError(f"Missing column for {name}: expected one of {', '.join(aliases)}")
+    return positions
+
+
+def iter_csv_chunks(path: str, wanted: Dict[str, Sequence[str]],
+                    chunk_size: int = DEFAULT_CHUNK_SIZE,
+                    optional: Sequence[str] = ()) -> Iterator[Dict[str, List[str]]]:
+    """Stream selected CSV columns in fixed-size chunks of column lists
+
+    Memory stays bounded by chunk_size regardless of the file size; short
+    rows yield empty strings for the missing columns.
+    """
+    with open(path, newline="") as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is None:
+            raise ValueError(f"{path} has no header")
+        positions = resolve_columns(header, wanted, optional)
+        chunk = {name: [] for name in positions}
+        rows = 0
+        for row in reader:
+            for name, pos in positions.items():
+                chunk[name].append(row[pos].strip() if pos < len(row) else "")
+            rows += 1
+            if rows == chunk_size:
+                yield chunk
+                chunk = {name: [] for name in positions}
+                rows = 0
+        if rows:
+            yield chunk
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""Bulk IP-to-country resolution against a local range table
+
+Resolves a column of IPv4 addresses (e.g. an export of
+license_verification_log) to ISO country codes without any network calls.
+Addresses are packed into a uint32 array and looked up in one searchsorted
+against the sorted range starts, then checked against the range ends.
+Resolved codes are validated against the country_codes.csv registry.
+
+The range table is a CSV of start, end and country code columns, with
+bounds given either as dotted addresses or as integers (the format of the
+common free IP-to-country databases).
+
+Usage:
+    python geoip_bulk.py logs.csv --ranges ip_ranges.csv [--output resolved.csv]
+"""
+import sys
+import csv
+import json
+import socket
+import argparse
+import logging
+from collections import Counter
+from functools import partial
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from bulk_io import DEFAULT_CHUNK_SIZE, iter_csv_chunks
+from license_core import DEFAULT_COUNTRY_CODES, load_country_codes
+
+logger = logging.getLogger("LicenseVerifier")
+
+INPUT_COLUMNS = {
+    "ip": ("ip_address", "ip", "address"),
+    "id": ("id", "log_id"),
+    "country": ("country_code", "country"),
+}
+RANGE_COLUMNS = {
+    "start": ("start", "ip_from", "range_start", "start_ip"),
+    "end": ("end", "ip_to", "range_end", "end_ip"),
+    "country": ("country", "country_code", "code"),
+}
+UNRESOLVED = ""
+MAX_IPV4 = 0xFFFFFFFF
+
+
+def ip_to_uint32(values: Iterable[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """Pack dotted IPv4 strings into a uint32 array
+
+    Returns (ips, valid); anything that is not an IPv4 address (including
+    IPv6) is 0 and flagged False in valid.
+    """
+    values = list(values)
+    valid = np.ones(len(values), dtype=bool)
+    # inet_pton rather than inet_aton, which also takes shorthand and octal forms
+    pack = partial(socket.inet_pton, socket.AF_INET)
+    try:
+        packed = b"".join(map(pack, values))
+    except OSError:
+        # Slow path only for chunks that contain a malformed address
+        chunks = []
+        for i, value in enumerate(values):
+            try:
+                chunks.append(pack(value))
+            except OSError:
+                chunks.append(b"\0\0\0\0")
+                valid[i] = False
+        packed = b"".join(chunks)
+    return np.frombuffer(packed, dtype=">u4").astype(np.uint32), valid
+
+
+def _parse_bound(value: str) -> int:
+    value = value.strip()
+    if value.isdigit():
+        bound = int(value)
+        # Integer-format databases also ship IPv4-mapped IPv6 ranges
+        if bound > MAX_IPV4:
+            raise ValueError(f"{value} is not an IPv4 address")
+        return bound
+    return int.from_bytes(socket.inet_pton(socket.AF_INET, value), "big")
+
+
+class CountryRangeTable:
+    """Sorted IPv4 ranges mapped to registry-validated country codes"""
+
+    def __init__(self, starts: np.ndarray, ends: np.ndarray, codes: List[str], code_ids: np.ndarray):
+        order = np.argsort(starts, kind="stable")
+        self.starts = starts[order]
+        self.ends = ends[order]
+        self.codes = codes
+        self.code_ids = code_ids[order]
+        overlaps = int((self.starts[1:] <= self.ends[:-1]).sum())
+        if overlaps:
+            logger.warning(f"Range table has {overlaps} overlapping ranges; the later start wins")
+
+    @classmethod
+    def load(cls, path: str, registry: Dict[str, str]) -> "CountryRangeTable":
+        """Read a range table CSV, dropping malformed ranges and codes not in the registry"""
+        starts, ends, code_ids = [], [], []
+        codes: Dict[str, int] = {}
+        skipped = Counter()
+        for chunk in iter_csv_chunks(path, RANGE_COLUMNS):
+            for start, end, code in zip(chunk["start"], chunk["end"], chunk["country"]):
+                code = code.upper()
+                if code not in registry:
+                    skipped[code] += 1
+                    continue
+                try:
+                    bounds = _parse_bound(start), _parse_bound(end)
+                except (OSError, ValueError):
+                    skipped["<malformed>"] += 1
+                    continue
+                if bounds[1] < bounds[0]:
+                    skipped["<malformed>"] += 1
+                    continue
+                starts.append(bounds[0])
+                ends.append(bounds[1])
+                code_ids.append(codes.setdefault(code, len(codes)))
+        if skipped:
+            logger.warning(f"Skipped {sum(skipped.values())} ranges with malformed bounds or codes "
+                           f"not in the registry: {', '.join(sorted(skipped)[:10])}")
+        if not starts:
+            logger.warning(f"No usable IP ranges in {path}; every address will be unresolved")
+        logger.info(f"Loaded {len(starts)} IP ranges covering {len(codes)} countries")
+        return cls(np.array(starts, dtype=np.uint32), np.array(ends, dtype=np.uint32),
+                   list(codes), np.array(code_ids, dtype=np.int32))
+
+    def lookup(self, ips: np.ndarray) -> np.ndarray:
+        """Country id per address, -1 where no range contains it"""
+        if self.starts.size == 0:
+            return np.full(len(ips), -1, dtype=np.int64)
+        idx = np.searchsorted(self.starts, ips, side="right") - 1
+        safe = np.maximum(idx, 0)
+        hit = (idx >= 0) & (ips <= self.ends[safe])
+        return np.where(hit, self.code_ids[safe], -1)
+
+    def resolve(self, values: Iterable[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """Resolve IP strings to country ids (-1 when unresolved) and an IPv4 validity mask"""
+        ips, valid = ip_to_uint32(values)
+        return np.where(valid, self.lookup(ips), -1), valid
+
+    def labels(self, ids: np.ndarray) -> List[str]:
+        """Country codes for resolved ids ("" when unresolved)"""
+        return np.array(self.codes + [UNRESOLVED], dtype=object)[ids].tolist()
+
+
+def backfill(input_path: str, table: CountryRangeTable, output_path: Optional[str] = None,
+             chunk_size: int = DEFAULT_CHUNK_SIZE) -> Dict[str, Any]:
+    """Resolve every row of an input CSV, optionally writing the results
+
+    When the input already has a country_code column, rows whose stored code
+    disagrees with the resolved one are counted as mismatches.
+    """
+    totals = {"rows": 0, "resolved": 0, "unresolved": 0, "invalid_ip": 0, "mismatched": 0}
+    country_counts = np.zeros(len(table.codes), dtype=np.int64)
+    code_ids = {code: i for i, code in enumerate(table.codes)}
+    out = open(output_path, "w", newline="") if output_path else None
+    writer = csv.writer(out) if out else None
+    try:
+        header_written = False
+        for chunk in iter_csv_chunks(input_path, INPUT_COLUMNS, chunk_size, optional=("id", "country")):
+            ids, valid = table.resolve(chunk["ip"])
+            resolved = ids >= 0
+            totals["rows"] += len(ids)
+            totals["resolved"] += int(resolved.sum())
+            totals["invalid_ip"] += int((~valid).sum())
+            totals["unresolved"] += int((valid & ~resolved).sum())
+            country_counts += np.bincount(ids[resolved], minlength=len(table.codes))
+
+            previous = chunk.get("country")
+            if previous is not None:
+                # Map the distinct stored codes onto table ids; codes the table lacks never match
+                distinct, inverse = np.unique(np.array(previous, dtype=str), return_inverse=True)
+                distinct_ids = np.array([code_ids.get(code.upper(), -1) if code else -2 for code in distinct.tolist()],
+                                        dtype=np.int64)
+                stored = distinct_ids[inverse.reshape(-1)]
+                totals["mismatched"] += int((resolved & (stored != -2) & (stored != ids)).sum())
+
+            if writer is not None:
+                columns = [name for name in ("id", "ip") if name in chunk]
+                if not header_written:
+                    writer.writerow([{"id": "id", "ip": "ip_address"}[c] for c in columns] + ["country_code"]
+                                    + (["previous_country_code"] if previous is not None else []))
+                    header_written = True
+                extra = [previous] if previous is not None else []
+                writer.writerows(zip(*[chunk[c] for c in columns], table.labels(ids), *extra))
+    finally:
+        if out is not None:
+            out.close()
+
+    order = np.argsort(-country_counts, kind="stable")
+    countries = {table.codes[i]: int(country_counts[i]) for i in order if country_counts[i]}
+    return {**totals, "countries": countries}
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Resolve IP addresses to countries from a local range table")
+    parser.add_argument("input", help="CSV with an ip_address column (and optional id, country_code)")
+    parser.add_argument("--ranges", required=True, help="CSV of start, end, country ranges")
+    parser.add_argument("--output", help="Write id, ip_address and resolved country_code to this CSV")
+    parser.add_argument("--country-codes", help="Country registry CSV (default: country_codes.csv)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="Input rows per chunk")
+    args = parser.parse_args(argv)
+
+    registry = load_country_codes(args.country_codes or DEFAULT_COUNTRY_CODES)
+    if not registry:
+        print(json.dumps({"error": "Country registry is empty"}))
+        return 1
+
+    table = CountryRangeTable.load(args.ranges, registry)
+    print(json.dumps(backfill(args.input, table, args.output, args.chunk_size), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
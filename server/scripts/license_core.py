@@ -0,0 +1,412 @@
+#!/usr/bin/env python3
+import os
+import csv
+import time
+import uuid
+import socket
+import hashlib
+import datetime
+import logging
+from collections import namedtuple
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import requests
+
+from snapshot import SNAPSHOT_FILE_NAME, StateSnapshot, file_validity
+
+logger = logging.getLogger("LicenseVerifier")
+
+# Checks in the order they run and appear in the results
+CHECK_ORDER = ("country", "mac", "expiry", "user_count")
+
+# Checks each license type needs, matching license.controller.js: expiry
+# always applies, the other checks only for their own type and "mixed"
+LICENSE_TYPE_CHECKS = {
+    "date_based": ("expiry",),
+    "user_count_based": ("expiry", "user_count"),
+    "mac_based": ("mac", "expiry"),
+    "country_based": ("country", "expiry"),
+    "mixed": CHECK_ORDER,
+}
+DEFAULT_LICENSE_TYPE = "mixed"
+
+DEFAULT_COUNTRY_CODES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "country_codes.csv")
+DEFAULT_GEOLOCATION_URL = "https://ipinfo.io/json"
+
+# How long snapshotted machine state stays valid, in seconds
+DEFAULT_FINGERPRINT_TTL = 300
+DEFAULT_GEOLOCATION_TTL = 600
+
+CheckPlan = namedtuple("CheckPlan", ["license_type", "checks", "skipped"])
+
+
+@lru_cache(maxsize=None)
+def compile_check_plan(license_type: Optional[str]) -> CheckPlan:
+    """Resolve the checks to run and skip for a license type"""
+    if license_type not in LICENSE_TYPE_CHECKS:
+        if license_type is not None:
+            logger.warning(f"Unknown license type {license_type!r}, running all checks")
+        license_type = DEFAULT_LICENSE_TYPE
+    checks = LICENSE_TYPE_CHECKS[license_type]
+    skipped = tuple(name for name in CHECK_ORDER if name not in checks)
+    return CheckPlan(license_type, checks, skipped)
+
+
+def run_check_plan(plan: CheckPlan, checks: Dict[str, Callable[[], Dict[str, Any]]]) -> Dict[str, Dict[str, Any]]:
+    """Run only the planned checks, in plan order"""
+    return {name: checks[name]() for name in plan.checks}
+
+
+def summarize_checks(checks: Dict[str, Dict[str, Any]],
+                     success_message: str = "License verification successful",
+                     failure_message: str = "License verification failed: ",
+                     notice_prefix: str = " with notices: ") -> Tuple[bool, str]:
+    """Combine check results into overall validity and a summary message
+
+    Failed checks make the license invalid; passed checks flagged with
+    "notice" (e.g. an upcoming expiry) are reported as warnings.
+    """
+    is_valid = True
+    messages = []
+
+    for check in checks.values():
+        if not check["valid"]:
+            is_valid = False
+            messages.append(check["message"])
+        elif check.get("notice"):
+            # Add warning even though license is valid
+            messages.append(check["message"])
+
+    if is_valid:
+        summary = success_message
+        if messages:  # Add warnings
+            summary += notice_prefix + "; ".join(messages)
+    else:
+        summary = failure_message + "; ".join(messages)
+
+    return is_valid, summary
+
+
+def load_country_codes(path: str = DEFAULT_COUNTRY_CODES) -> Dict[str, str]:
+    """Read the country registry CSV as a code -> name map"""
+    country_map = {}
+    try:
+        with open(path, 'r') as f:
+            reader = csv.reader(f)
+            next(reader, None)  # Skip header if it exists
+            for row in reader:
+                if len(row) >= 2:
+                    name, code = row[0].strip(), row[1].strip()
+                    country_map[code] = name
+        logger.info(f"Loaded {len(country_map)} country codes")
+    except Exception as e:
+        logger.error(f"Failed to load country codes: {e}")
+    return country_map
+
+
+def get_local_ip() -> str:
+    """Address of the interface used for outbound traffic
+
+    Connecting a UDP socket sends no packets, so this is a cheap local proxy
+    for "the network we are on" that changes when the public IP is likely to.
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        sock.connect(("192.0.2.1", 80))
+        return sock.getsockname()[0]
+    except OSError:
+        return "0.0.0.0"
+    finally:
+        sock.close()
+
+
+class LicenseVerifierCore:
+    """Shared license checks, driven by a per-license-type check plan"""
+
+    def __init__(self, cache_dir: Optional[str] = None, country_codes_path: Optional[str] = None,
+                 snapshot=None):
+        """Initialize the verifier with its cache directory and country registry"""
+        self.cache_dir = (cache_dir or os.environ.get("LICENSE_CACHE_DIR")
+                          or os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache"))
+        self.geolocation_url = os.environ.get("LICENSE_GEOLOCATION_URL", DEFAULT_GEOLOCATION_URL)
+        self.fingerprint_ttl = float(os.environ.get("LICENSE_FINGERPRINT_TTL", DEFAULT_FINGERPRINT_TTL))
+        self.geolocation_ttl = float(os.environ.get("LICENSE_GEOLOCATION_TTL", DEFAULT_GEOLOCATION_TTL))
+        self.country_codes_path = country_codes_path or DEFAULT_COUNTRY_CODES
+        # Milliseconds spent in each check of the most recent verification
+        self.last_check_timings: Dict[str, float] = {}
+        # Country resolved by the most recent country check, 'Unknown' if the lookup failed
+        self.last_country: Optional[str] = None
+
+        # Create cache directory if it doesn't exist
+        if not os.path.exists(self.cache_dir):
+            os.makedirs(self.cache_dir)
+
+        # Warm-start state shared by short-lived processes, on unless
+        # disabled with snapshot=False or LICENSE_SNAPSHOT=0
+        if snapshot is None:
+            snapshot = os.environ.get("LICENSE_SNAPSHOT", "1").lower() not in ("0", "false", "no", "off")
+        if snapshot is True:
+            snapshot = StateSnapshot(os.path.join(self.cache_dir, SNAPSHOT_FILE_NAME))
+        self.snapshot = snapshot or None
+
+        self.country_names = self._load_country_registry()
+
+    def _load_country_registry(self) -> Dict[str, str]:
+        """Country registry from the snapshot, re-parsed only when the CSV changed"""
+        if self.snapshot is None:
+            return self._load_country_codes()
+
+        validity = file_validity(self.country_codes_path)
+        country_map = self.snapshot.get("country_registry", validity)
+        if country_map is None:
+            country_map = self._load_country_codes()
+            if country_map:
+                self.snapshot.put("country_registry", country_map, validity)
+        return country_map
+
+    def _load_country_codes(self) -> Dict[str, str]:
+        """Load country codes from CSV file"""
+        return load_country_codes(self.country_codes_path)
+
+    def get_current_country(self) -> str:
+        """Get country code from public IP, reusing a recent snapshotted lookup"""
+        validity = None
+        if self.snapshot is not None:
+            # A lookup is only reused on the same network and geolocation service
+            validity = {"local_ip": get_local_ip(), "url": self.geolocation_url}
+            location = self.snapshot.get("geolocation", validity, self.geolocation_ttl)
+            if location is not None:
+                return location["country"]
+
+        try:
+            response = requests.get(self.geolocation_url, timeout=5)
+            data = response.json()
+            country = data.get('country', 'Unknown')
+            city = data.get('city', 'Unknown')
+            region = data.get('region', 'Unknown')
+            ip = data.get('ip', 'Unknown')
+
+            country_name = self.country_names.get(country, "Unknown")
+            logger.info(f"Detected location: {city}, {region}, {country_name} ({country})")
+            logger.info(f"Public IP: {ip}")
+
+            if self.snapshot is not None and country != 'Unknown':
+                self.snapshot.put("geolocation", {
+                    "country": country,
+                    "city": city,
+                    "region": region,
+                    "ip": ip,
+                    "resolved_at": time.time()
+                }, validity)
+            return country
+        except Exception as e:
+            logger.error(f"Failed to get country from IP: {e}")
+            return 'Unknown'
+
+    def get_system_mac(self) -> str:
+        """Get the primary system MAC address"""
+        return self.get_system_macs()[0]
+
+    def get_system_macs(self) -> List[str]:
+        """Get all MAC addresses, reusing a recent snapshotted enumeration"""
+        if self.snapshot is None:
+            return self._enumerate_system_macs()
+
+        fingerprint = self.snapshot.get("fingerprint", max_age=self.fingerprint_ttl)
+        if fingerprint is not None:
+            return fingerprint["macs"]
+
+        macs = self._enumerate_system_macs()
+        self.snapshot.put("fingerprint", {
+            "macs": macs,
+            "digest": hashlib.sha256(",".join(sorted(macs)).encode()).hexdigest()[:16]
+        })
+        return macs
+
+    def _enumerate_system_macs(self) -> List[str]:
+        """Get all MAC addresses from all network interfaces"""
+        macs = []
+        try:
+            # Using uuid method for primary MAC
+            macs.append(':'.join(['{:02X}'.format((uuid.getnode() >> ele) & 0xff)
+                                  for ele in range(0, 8 * 6, 8)][::-1]))
+
+            # Try to get more MAC addresses using additional methods
+            try:
+                import netifaces
+                for iface in netifaces.interfaces():
+                    addrs = netifaces.ifaddresses(iface)
+                    if netifaces.AF_LINK in addrs:
+                        for link in addrs[netifaces.AF_LINK]:
+                            mac = link.get('addr')
+                            if mac and mac != '00:00:00:00:00:00' and mac.upper() not in macs:
+                                macs.append(mac.upper())
+            except ImportError:
+                logger.debug("netifaces not installed, using only primary MAC")
+
+            logger.info(f"System MAC addresses: {macs}")
+        except Exception as e:
+            logger.error(f"Error getting MAC addresses: {e}")
+            if not macs:  # Ensure we return at least an empty list
+                macs.append("00:00:00:00:00:00")
+
+        return macs
+
+    def get_fingerprint_digest(self) -> str:
+        """Short digest identifying this machine's network hardware"""
+        return hashlib.sha256(",".join(sorted(self.get_system_macs())).encode()).hexdigest()[:16]
+
+    def check_country(self, license_key: str, allowed_countries: List[str]) -> Tuple[bool, str]:
+        """Check if current country is in allowed countries list"""
+        self.last_country = None
+        if not allowed_countries:
+            logger.warning(f"No allowed countries specified for license {license_key}")
+            return False, "No allowed countries specified in license"
+
+        current_country = self.get_current_country()
+        self.last_country = current_country
+        country_name = self.country_names.get(current_country, current_country)
+
+        if current_country in allowed_countries:
+            return True, f"Country {country_name} ({current_country}) is allowed"
+        else:
+            return False, f"License not valid in {country_name} ({current_country})"
+
+    def check_mac(self, license_key: str, allowed_macs: List[str]) -> Tuple[bool, str]:
+        """Check if any system MAC matches allowed MACs"""
+        if not allowed_macs:
+            logger.warning(f"No MAC addresses specified for license {license_key}")
+            return False, "No MAC addresses specified in license"
+
+        system_macs = self.get_system_macs()
+        allowed_macs_upper = [m.upper() for m in allowed_macs]
+
+        for mac in system_macs:
+            if mac in allowed_macs_upper:
+                return True, f"MAC address {mac} is authorized"
+
+        return False, "This system's MAC addresses are not authorized"
+
+    def check_expiry(self, license_key: str, expiry_date: Optional[str],
+                     grace_period_days: int = 0) -> Tuple[bool, str]:
+        """Check if license has expired or is about to expire
+
+        An expired license stays valid, with a warning, for grace_period_days
+        after its expiry date, as in the API's own verification.
+        """
+        if expiry_date is None:
+            # Perpetual license, as in the API's own verification
+            return True, "No expiry date set"
+        try:
+            today = datetime.date.today()
+            expiry = datetime.datetime.strptime(expiry_date, "%Y-%m-%d").date()
+            days_left = (expiry - today).days
+
+            if days_left < 0 and -days_left <= grace_period_days:
+                return True, (f"License expired {abs(days_left)} days ago but is in grace period "
+                              f"({grace_period_days + days_left} days left). Please renew.")
+            elif days_left < 0:
+                return False, f"License expired {abs(days_left)} days ago"
+            elif days_left <= 30:
+                return True, f"License expires soon (in {days_left} days). Please renew."
+            else:
+                return True, f"License valid for {days_left} more days"
+        except Exception as e:
+            logger.error(f"Error checking expiry for license {license_key}: {e}")
+            return False, "Invalid expiry date format"
+
+    def get_user_count(self, license_key: str) -> int:
+        """Read the current seat count for a license"""
+        user_count_file = os.path.join(self.cache_dir, f"user_count_{license_key}.txt")
+        try:
+            with open(user_count_file, 'r') as f:
+                return int(f.read().strip())
+        except FileNotFoundError:
+            return 0
+
+    def check_user_count(self, license_key: str, max_users: Optional[int],
+                         adding_new_user: bool = False) -> Tuple[bool, str]:
+        """Check and update user count for license"""
+        if max_users is None:
+            # Unlimited seats; the API does not track a count for these either
+            return True, "No user limit set"
+        try:
+            return self._check_user_count_file(license_key, max_users, adding_new_user)
+        except Exception as e:
+            logger.error(f"Error checking user count for license {license_key}: {e}")
+            return False, f"User count check failed: {str(e)}"
+
+    def _check_user_count_file(self, license_key: str, max_users: int, adding_new_user: bool) -> Tuple[bool, str]:
+        """File-based implementation of user count check"""
+        user_count_file = os.path.join(self.cache_dir, f"user_count_{license_key}.txt")
+        current_users = self.get_user_count(license_key)
+
+        if adding_new_user:
+            if current_users >= max_users:
+                return False, f"User limit reached: {current_users}/{max_users}"
+            else:
+                current_users += 1
+                with open(user_count_file, 'w') as f:
+                    f.write(str(current_users))
+                return True, f"New user added: {current_users}/{max_users}"
+        else:
+            if current_users >= max_users:
+                return False, f"User limit reached: {current_users}/{max_users}"
+            else:
+                return True, f"User count OK: {current_users}/{max_users}"
+
+    def get_check_plan(self, license_details: Dict[str, Any]) -> CheckPlan:
+        """Check plan for a license record"""
+        return compile_check_plan(license_details.get("license_type", DEFAULT_LICENSE_TYPE))
+
+    def run_check(self, check_name: str, license_key: str, license_details: Dict[str, Any],
+                  adding_new_user: bool = False) -> Dict[str, Any]:
+        """Run a single named check against the license details"""
+        if check_name == "country":
+            valid, message = self.check_country(license_key, license_details.get("allowed_countries", []))
+        elif check_name == "mac":
+            valid, message = self.check_mac(license_key, license_details.get("allowed_macs", []))
+        elif check_name == "expiry":
+            valid, message = self.check_expiry(license_key, license_details.get("expiry_date", "2000-01-01"),
+                                               license_details.get("grace_period_days") or 0)
+        elif check_name == "user_count":
+            valid, message = self.check_user_count(
+                license_key, license_details.get("max_users", 1), adding_new_user)
+        else:
+            raise ValueError(f"Unknown check: {check_name}")
+
+        check = {"valid": valid, "message": message}
+        if check_name == "expiry" and valid and ("expires soon" in message or "grace period" in message):
+            check["notice"] = True
+        if check_name == "country" and self.last_country == "Unknown":
+            # Failed geolocation, e.g. a network error; not a stable result
+            check["lookup_failed"] = True
+        return check
+
+    def _timed_check(self, check_name: str, license_key: str, license_details: Dict[str, Any],
+                     adding_new_user: bool) -> Dict[str, Any]:
+        start = time.perf_counter()
+        try:
+            return self.run_check(check_name, license_key, license_details, adding_new_user)
+        finally:
+            self.last_check_timings[check_name] = round((time.perf_counter() - start) * 1000, 3)
+
+    def verify_details(self, license_key: str, license_details: Dict[str, Any],
+                       adding_new_user: bool = False) -> Tuple[bool, str, Dict[str, Any]]:
+        """Run the license type's check plan and build the results report"""
+        plan = self.get_check_plan(license_details)
+        self.last_check_timings = {}
+        results = {
+            "license_key": license_key,
+            "tier": license_details.get("tier", "Unknown"),
+            "license_type": plan.license_type,
+            "checks": run_check_plan(plan, {
+                name: (lambda name=name: self._timed_check(name, license_key, license_details, adding_new_user))
+                for name in plan.checks
+            }),
+            "skipped_checks": list(plan.skipped),
+            "features": license_details.get("features", [])
+        }
+        is_valid, summary = summarize_checks(results["checks"])
+        return is_valid, summary, results
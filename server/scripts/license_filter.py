@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+import os
+import re
+import math
+import struct
+import hashlib
+import logging
+from typing import Callable, Iterable, Optional
+
+logger = logging.getLogger("LicenseVerifier")
+
+# Keys are issued as dash-separated uppercase alphanumeric groups, e.g.
+# "PREMIUM-123" or the generated "1A2B-3C4D-5E6F-7A8B" format.
+LICENSE_KEY_PATTERN = re.compile(r"^[A-Z0-9]{1,16}(?:-[A-Z0-9]{1,16}){1,7}$")
+
+DEFAULT_FP_RATE = 0.01
+DEFAULT_MAX_BYTES = 1024 * 1024
+
+_MAGIC = b"VKBF"
+_FORMAT_VERSION = 1
+_HEADER = struct.Struct("<4sHIQH")
+
+
+def is_well_formed_key(license_key) -> bool:
+    """Cheap syntactic check run before any lookup"""
+    return isinstance(license_key, str) and LICENSE_KEY_PATTERN.match(license_key) is not None
+
+
+class KnownKeyFilter:
+    """Bloom filter over the known license keys
+
+    A negative answer is definitive, a positive answer may be a false
+    positive at roughly the configured rate.
+    """
+
+    def __init__(self, num_bits: int, num_hashes: int, bits: Optional[bytearray] = None,
+                 table_version: str = ""):
+        self.num_bits = max(8, num_bits)
+        self.num_hashes = max(1, num_hashes)
+        self.bits = bits if bits is not None else bytearray((self.num_bits + 7) // 8)
+        self.table_version = table_version
+
+    @classmethod
+    def for_capacity(cls, expected_keys: int, fp_rate: float = DEFAULT_FP_RATE,
+                     max_bytes: int = DEFAULT_MAX_BYTES, table_version: str = "") -> "KnownKeyFilter":
+        """Size the filter for the expected number of keys and false-positive rate"""
+        n = max(1, expected_keys)
+        fp_rate = min(max(fp_rate, 1e-9), 0.5)
+        num_bits = int(math.ceil(-n * math.log(fp_rate) / (math.log(2) ** 2)))
+        if max_bytes and num_bits > max_bytes * 8:
+            logger.warning(f"Key filter capped at {max_bytes} bytes, false-positive rate will exceed {fp_rate}")
+            num_bits = max_bytes * 8
+        num_hashes = int(round(num_bits / n * math.log(2)))
+        return cls(num_bits, num_hashes, table_version=table_version)
+
+    @classmethod
+    def from_keys(cls, keys: Iterable[str], fp_rate: float = DEFAULT_FP_RATE,
+                  max_bytes: int = DEFAULT_MAX_BYTES, table_version: str = "") -> "KnownKeyFilter":
+        """Build a filter containing every key"""
+        keys = list(keys)
+        key_filter = cls.for_capacity(len(keys), fp_rate, max_bytes, table_version)
+        for key in keys:
+            key_filter.add(key)
+        return key_filter
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1, h2 = struct.unpack("<QQ", digest)
+        h2 |= 1  # Keep the stride odd so probes never collapse onto one bit
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+
+    def add(self, key: str):
+        for pos in self._positions(key):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, key: str) -> bool:
+        bits = self.bits
+        for pos in self._positions(key):
+            if not bits[pos >> 3] & (1 << (pos & 7)):
+                return False
+        return True
+
+    def save(self, path: str):
+        """Write the filter atomically so concurrent readers never see a partial file"""
+        version = self.table_version.encode()
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(_HEADER.pack(_MAGIC, _FORMAT_VERSION, self.num_hashes, self.num_bits, len(version)))
+            f.write(version)
+            f.write(self.bits)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["KnownKeyFilter"]:
+        """Read a persisted filter, returning None if it is missing or unreadable"""
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            magic, fmt, num_hashes, num_bits, version_len = _HEADER.unpack_from(data)
+            if magic != _MAGIC or fmt != _FORMAT_VERSION:
+                return None
+            offset = _HEADER.size
+            version = data[offset:offset + version_len].decode()
+            bits = bytearray(data[offset + version_len:])
+            if len(bits) != (num_bits + 7) // 8:
+                return None
+            return cls(num_bits, num_hashes, bits, version)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable key filter {path}: {e}")
+            return None
+
+
+def load_or_build(path: str, keys: Callable[[], Iterable[str]], table_version: str,
+                  fp_rate: float = DEFAULT_FP_RATE, max_bytes: int = DEFAULT_MAX_BYTES) -> KnownKeyFilter:
+    """Load the persisted filter, rebuilding it when the license table has changed"""
+    key_filter = KnownKeyFilter.load(path)
+    if key_filter is not None and key_filter.table_version == table_version:
+        return key_filter
+
+    key_filter = KnownKeyFilter.from_keys(keys(), fp_rate, max_bytes, table_version)
+    try:
+        key_filter.save(path)
+        logger.info(f"Rebuilt known-key filter ({key_filter.num_bits} bits, {key_filter.num_hashes} hashes)")
+    except OSError as e:
+        logger.warning(f"Could not persist key filter to {path}: {e}")
+    return key_filter
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""Incremental sync of license records into the verifier's local store
+
+Pulls only the licenses whose updated_at moved past the stored high-water
+mark (with their allowed countries and MAC addresses) plus deletion
+tombstones from GET /api/licenses/changes, and applies each batch to a
+SQLite store in one transaction. The verifier reads licenses from this
+store when it exists.
+
+Usage:
+    python license_sync.py [--url http://localhost:8080] [--interval 60]
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import sqlite3
+import logging
+import argparse
+import datetime
+from typing import Any, Dict, List, Optional
+
+import requests
+
+logger = logging.getLogger("LicenseVerifier")
+
+STORE_FILE_NAME = "licenses.sqlite3"
+DEFAULT_SYNC_URL = "http://localhost:8080"
+DEFAULT_TIER = "Standard"
+# Re-read this many seconds before the high-water mark so rows committed
+# late by a slow transaction are not skipped; re-applying them is harmless
+DEFAULT_OVERLAP = 5.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS licenses (
+    id TEXT PRIMARY KEY,
+    license_key TEXT NOT NULL UNIQUE,
+    record TEXT NOT NULL,
+    updated_at TEXT
+);
+CREATE TABLE IF NOT EXISTS sync_state (
+    name TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+def default_store_path(cache_dir: str) -> str:
+    return os.environ.get("LICENSE_STORE") or os.path.join(cache_dir, STORE_FILE_NAME)
+
+
+def _local_date(timestamp: Optional[str]) -> Optional[str]:
+    """Calendar date of an ISO timestamp in local time, as the API compares expiry"""
+    if not timestamp:
+        return None
+    # Sequelize serializes dates as UTC timestamps, which can fall on the previous day
+    moment = datetime.datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+    if moment.tzinfo is not None:
+        moment = moment.astimezone()
+    return moment.date().isoformat()
+
+
+def to_verifier_record(license: Dict[str, Any]) -> Dict[str, Any]:
+    """Map a license from the changes feed to the verifier's record fields
+
+    Null expiry dates and user limits stay null; the verifier skips those
+    checks, as the API's own verification does.
+    """
+    return {
+        "license_type": license.get("license_type"),
+        "allowed_countries": license.get("allowed_countries") or [],
+        "allowed_macs": license.get("mac_addresses") or [],
+        "expiry_date": _local_date(license.get("expiry_date")),
+        "grace_period_days": license.get("grace_period_days") or 0,
+        "max_users": license.get("max_users_allowed"),
+        "tier": license.get("tier") or DEFAULT_TIER,
+        "features": license.get("features") or []
+    }
+
+
+class LicenseStore:
+    """SQLite copy of the license records, keyed by license id
+
+    Every applied batch bumps a revision number, which the verifier uses as
+    its license table version so derived state (known-key filter, snapshot)
+    is rebuilt only when the store actually changed.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        # Verifier processes keep reading while a sync transaction commits
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(_SCHEMA)
+        # Distinguishes a recreated store whose revisions restart from 0
+        if self._state("store_id") is None:
+            with self.conn:
+                self._set_state("store_id", uuid.uuid4().hex)
+
+    def _state(self, name: str) -> Optional[str]:
+        row = self.conn.execute("SELECT value FROM sync_state WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def _set_state(self, name: str, value: str):
+        self.conn.execute("INSERT OR REPLACE INTO sync_state (name, value) VALUES (?, ?)", (name, value))
+
+    def high_water_mark(self) -> Optional[str]:
+        return self._state("high_water_mark")
+
+    def revision(self) -> int:
+        return int(self._state("revision") or 0)
+
+    def version(self) -> str:
+        """Identify the store's current contents for derived-state validity"""
+        return f"{self._state('store_id')}:{self.revision()}"
+
+    def get(self, license_key: str) -> Optional[Dict[str, Any]]:
+        row = self.conn.execute("SELECT record FROM licenses WHERE license_key = ?", (license_key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def table(self) -> Dict[str, Dict[str, Any]]:
+        return {key: json.loads(record)
+                for key, record in self.conn.execute("SELECT license_key, record FROM licenses")}
+
+    def apply(self, changes: Dict[str, Any], full: bool = False) -> int:
+        """Apply one batch from the changes feed atomically
+
+        A full batch replaces the whole store. Returns the number of
+        licenses written or removed.
+        """
+        applied = 0
+        with self.conn:
+            if full:
+                applied += self.conn.execute("DELETE FROM licenses").rowcount
+            for tombstone in changes.get("deleted", []):
+                applied += self.conn.execute("DELETE FROM licenses WHERE id = ?", (tombstone["id"],)).rowcount
+            for license in changes.get("licenses", []):
+                # Licenses without a key cannot be verified; drop any stale copy
+                if not license.get("license_key"):
+                    applied += self.conn.execute("DELETE FROM licenses WHERE id = ?", (license["id"],)).rowcount
+                    continue
+                record = json.dumps(to_verifier_record(license), sort_keys=True)
+                current = self.conn.execute("SELECT license_key, record FROM licenses WHERE id = ?",
+                                            (license["id"],)).fetchone()
+                # Rows re-read in the overlap window are usually unchanged
+                if current == (license["license_key"], record):
+                    continue
+                # A key may have moved to a new license row; the newer row wins
+                self.conn.execute("DELETE FROM licenses WHERE license_key = ? AND id != ?",
+                                  (license["license_key"], license["id"]))
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO licenses (id, license_key, record, updated_at) VALUES (?, ?, ?, ?)",
+                    (license["id"], license["license_key"], record, license.get("updated_at"))
+                )
+                applied += 1
+            if applied:
+                self._set_state("revision", str(self.revision() + 1))
+            self._set_state("high_water_mark", changes["until"])
+        return applied
+
+    def close(self):
+        self.conn.close()
+
+
+class LicenseSync:
+    """Pulls license changes from the API into a LicenseStore"""
+
+    def __init__(self, store: LicenseStore, base_url: str, overlap: float = DEFAULT_OVERLAP, timeout: float = 30):
+        self.store = store
+        self.base_url = base_url.rstrip("/")
+        self.overlap = overlap
+        self.timeout = timeout
+
+    def sync_once(self) -> Dict[str, Any]:
+        """Fetch and apply the changes since the stored high-water mark"""
+        start = time.perf_counter()
+        mark = self.store.high_water_mark()
+        params = {}
+        if mark:
+            since = datetime.datetime.fromisoformat(mark.replace("Z", "+00:00"))
+            params["since"] = (since - datetime.timedelta(seconds=self.overlap)).isoformat()
+
+        response = requests.get(f"{self.base_url}/api/licenses/changes", params=params, timeout=self.timeout)
+        response.raise_for_status()
+        changes = response.json()
+
+        applied = self.store.apply(changes, full=not mark)
+        stats = {
+            "full": not mark,
+            "changed": len(changes.get("licenses", [])),
+            "deleted": len(changes.get("deleted", [])),
+            "applied": applied,
+            "revision": self.store.revision(),
+            "high_water_mark": changes["until"],
+            "elapsed_ms": round((time.perf_counter() - start) * 1000, 1)
+        }
+        logger.info(f"License sync: {stats['changed']} changed, {stats['deleted']} deleted, "
+                    f"revision {stats['revision']} in {stats['elapsed_ms']} ms")
+        return stats
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Incrementally sync licenses into the verifier's local store")
+    parser.add_argument("--url", default=os.environ.get("LICENSE_SYNC_URL", DEFAULT_SYNC_URL),
+                        help="Base URL of the licensing API")
+    parser.add_argument("--store", help="SQLite store path (default: cache/licenses.sqlite3 or LICENSE_STORE)")
+    parser.add_argument("--interval", type=float, default=0, help="Repeat every N seconds (default: run once)")
+    parser.add_argument("--overlap", type=float, default=DEFAULT_OVERLAP,
+                        help="Seconds to re-read before the high-water mark")
+    parser.add_argument("--full", action="store_true", help="Discard the high-water mark and resync everything")
+    args = parser.parse_args(argv)
+
+    cache_dir = os.environ.get("LICENSE_CACHE_DIR") or os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache")
+    store = LicenseStore(args.store or default_store_path(cache_dir))
+    if args.full:
+        with store.conn:
+            store.conn.execute("DELETE FROM sync_state WHERE name = 'high_water_mark'")
+    sync = LicenseSync(store, args.url, args.overlap)
+
+    while True:
+        try:
+            print(json.dumps(sync.sync_once()))
+        except (requests.RequestException, ValueError, KeyError) as e:
+            print(json.dumps({"error": str(e)}))
+            if not args.interval:
+                return 1
+        if not args.interval:
+            return 0
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+"""Load-test harness for the Node -> Python license verification path
+
+Drives either the Express routes (POST /verify and /add-user) or the
+verify_license.py entry point directly, spawned the same way
+callPythonVerifier does, with a configurable concurrency and key mix.
+Geolocation goes to a local ipinfo.io stub with controllable latency and
+failure rate, so runs are repeatable and never touch the real service.
+
+Examples:
+    python loadtest.py --requests 500 --concurrency 16
+    python loadtest.py --mix valid=50,expired=20,unknown=20,add-user=10 --geo-latency-ms 200
+    python loadtest.py --url http://localhost:8080/api/licenses --geo-port 9191
+
+In --url mode the Node server must be started with
+LICENSE_GEOLOCATION_URL=http://127.0.0.1:<geo-port>/json so the verifier
+it spawns uses the stub, and --cache-dir should match its
+LICENSE_CACHE_DIR so lost seat increments are counted. Every request
+reaches the server from this host's IP, so unless the run is meant to
+measure throttling (--throttle) the server also needs LICENSE_RATE_LIMITS
+set to the unthrottled limits this harness prints at startup; otherwise
+the per-client bucket rejects nearly every request. Requests carry a
+licenseKey, which POST /verify routes to the Python verifier.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import threading
+import subprocess
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+VERIFIER_SCRIPT = os.path.join(SCRIPT_DIR, "verify_license.py")
+
+# Demo keys from verify_license.py for each traffic class
+KEY_CLASSES = {
+    "valid": ["PREMIUM-123", "STANDARD-456"],
+    "expired": ["EXPIRED-999"],
+    "add-user": ["PREMIUM-123"],
+}
+DEFAULT_MIX = "valid=60,expired=15,unknown=15,add-user=10"
+
+# Generous limits so throttling does not mask verifier performance
+UNTHROTTLED_LIMITS = {
+    tier: {"key_per_minute": 1e9, "client_per_minute": 1e9, "burst": 1e9}
+    for tier in ("Premium", "Standard", "Basic")
+}
+
+
+class GeolocationStub:
+    """Local stand-in for ipinfo.io/json with injectable latency and failures"""
+
+    def __init__(self, port=0, latency_ms=0.0, jitter_ms=0.0, failure_rate=0.0, country="US"):
+        stub = self
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.failure_rate = failure_rate
+        self.country = country
+        self.calls = 0
+        self.failures = 0
+        self._lock = threading.Lock()
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                stub._handle(self)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/json"
+
+    def _handle(self, request):
+        delay = self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)
+        if delay > 0:
+            time.sleep(delay / 1000)
+        failed = random.random() < self.failure_rate
+        with self._lock:
+            self.calls += 1
+            self.failures += failed
+
+        if failed:
+            request.send_response(503)
+            request.end_headers()
+            request.wfile.write(b"Service Unavailable")
+            return
+        body = json.dumps({"ip": "203.0.113.10", "city": "Loadtest", "region": "Stub",
+                           "country": self.country}).encode()
+        request.send_response(200)
+        request.send_header("Content-Type", "application/json")
+        request.send_header("Content-Length", str(len(body)))
+        request.end_headers()
+        request.wfile.write(body)
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def parse_mix(mix):
+    """Parse "valid=60,unknown=20,..." into (classes, weights)"""
+    classes, weights = [], []
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name != "unknown" and name not in KEY_CLASSES:
+            raise argparse.ArgumentTypeError(f"Unknown traffic class: {name}")
+        classes.append(name)
+        weights.append(float(weight or 1))
+    return classes, weights
+
+
+def pick_request(traffic_class):
+    """Return (license_key, add_user) for one request of the given class"""
+    if traffic_class == "unknown":
+        return f"LOAD-{random.getrandbits(32):08X}", False
+    return random.choice(KEY_CLASSES[traffic_class]), traffic_class == "add-user"
+
+
+def call_process(license_key, add_user, env):
+    """Spawn the verifier like callPythonVerifier in license.routes.js"""
+    args = [sys.executable, VERIFIER_SCRIPT, license_key, "add-user" if add_user else "verify", "127.0.0.1"]
+    proc = subprocess.run(args, capture_output=True, text=True, env=env)
+    if proc.returncode != 0:
+        raise RuntimeError(f"Verification script failed with code {proc.returncode}")
+    return json.loads(proc.stdout)
+
+
+def call_http(base_url, license_key, add_user):
+    """POST to the Express route, returning the JSON body"""
+    request = urllib.request.Request(
+        f"{base_url.rstrip('/')}/{'add-user' if add_user else 'verify'}",
+        data=json.dumps({"licenseKey": license_key}).encode(),
+        headers={"Content-Type": "application/json"},
+        method="POST"
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=60) as response:
+            return json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        if e.code == 429:
+            return json.loads(e.read())
+        raise
+
+
+def read_seat_count(cache_dir, license_key):
+    try:
+        with open(os.path.join(cache_dir, f"user_count_{license_key}.txt")) as f:
+            return int(f.read().strip())
+    except (OSError, ValueError):
+        return 0
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize(samples, elapsed):
+    """Throughput, latency percentiles and outcome counts for a list of samples"""
+    latencies = sorted(s["latency_ms"] for s in samples)
+    count = len(samples)
+    return {
+        "requests": count,
+        "throughput_rps": round(count / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+        "errors": sum(1 for s in samples if s["outcome"] == "error"),
+        "error_rate": round(sum(1 for s in samples if s["outcome"] == "error") / count, 4) if count else 0.0,
+        "throttled": sum(1 for s in samples if s["outcome"] == "throttled"),
+        "valid": sum(1 for s in samples if s["outcome"] == "valid"),
+        "invalid": sum(1 for s in samples if s["outcome"] == "invalid"),
+    }
+
+
+def run_load(args):
+    classes, weights = parse_mix(args.mix)
+
+    with GeolocationStub(args.geo_port, args.geo_latency_ms, args.geo_jitter_ms,
+                         args.geo_failure_rate, args.geo_country) as stub:
+        if args.url:
+            # Seat counts are read from the verifier's cache, resolved as it does
+            cache_dir = (args.cache_dir or os.environ.get("LICENSE_CACHE_DIR")
+                         or os.path.join(SCRIPT_DIR, "cache"))
+            print(f"Geolocation stub listening on {stub.url}", file=sys.stderr)
+            if not os.path.isdir(cache_dir):
+                print(f"Cache directory {cache_dir} does not exist; seat counts will read as 0, "
+                      f"pass --cache-dir to match the server's LICENSE_CACHE_DIR", file=sys.stderr)
+            if not args.throttle:
+                # All requests share one client IP; the server must not throttle it
+                print(f"Start the server with LICENSE_RATE_LIMITS='{json.dumps(UNTHROTTLED_LIMITS)}' "
+                      f"or its rate limits will dominate the results", file=sys.stderr)
+        else:
+            cache_dir = args.cache_dir or tempfile.mkdtemp(prefix="license-loadtest-")
+            env = dict(os.environ, LICENSE_GEOLOCATION_URL=stub.url, LICENSE_CACHE_DIR=cache_dir)
+            if not args.throttle:
+                env["LICENSE_RATE_LIMITS"] = json.dumps(UNTHROTTLED_LIMITS)
+
+        seat_keys = set(KEY_CLASSES["add-user"])
+        seats_before = {key: read_seat_count(cache_dir, key) for key in seat_keys}
+
+        def one_request(_):
+            traffic_class = random.choices(classes, weights)[0]
+            license_key, add_user = pick_request(traffic_class)
+            sample = {"class": traffic_class, "key": license_key, "seat_added": False}
+            start = time.perf_counter()
+            try:
+                if args.url:
+                    result = call_http(args.url, license_key, add_user)
+                    valid = result.get("valid", result.get("success"))
+                else:
+                    result = call_process(license_key, add_user, env)
+                    valid = result.get("valid")
+                details = result.get("details") or {}
+                if details.get("status") == "throttled" or result.get("status") == "throttled":
+                    sample["outcome"] = "throttled"
+                else:
+                    sample["outcome"] = "valid" if valid else "invalid"
+                user_check = (details.get("checks") or {}).get("user_count") or {}
+                sample["seat_added"] = add_user and user_check.get("message", "").startswith("New user added")
+            except Exception as e:
+                sample["outcome"] = "error"
+                sample["error"] = str(e)
+            sample["latency_ms"] = (time.perf_counter() - start) * 1000
+            return sample
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            samples = list(pool.map(one_request, range(args.requests)))
+        elapsed = time.perf_counter() - start
+
+        seats_after = {key: read_seat_count(cache_dir, key) for key in seat_keys}
+        reported = sum(1 for s in samples if s["seat_added"])
+        recorded = sum(seats_after[key] - seats_before[key] for key in seat_keys)
+
+        report = {
+            "target": args.url or "process",
+            "concurrency": args.concurrency,
+            "mix": args.mix,
+            "elapsed_s": round(elapsed, 3),
+            "overall": summarize(samples, elapsed),
+            "by_class": {
+                name: summarize([s for s in samples if s["class"] == name], elapsed)
+                for name in classes
+            },
+            "seats": {
+                "reported_added": reported,
+                "recorded_added": recorded,
+                "lost_increments": max(0, reported - recorded),
+            },
+            "geolocation_stub": {"calls": stub.calls, "failures": stub.failures},
+            "sample_errors": sorted({s["error"] for s in samples if s["outcome"] == "error"})[:5],
+        }
+    return report
+
+
+def print_report(report):
+    print(f"Target: {report['target']}  concurrency={report['concurrency']}  mix={report['mix']}")
+    print(f"Elapsed: {report['elapsed_s']}s")
+    header = f"{'class':<10}{'reqs':>7}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'err%':>8}{'thr':>6}"
+    print(header)
+    print("-" * len(header))
+    rows = [("overall", report["overall"])] + list(report["by_class"].items())
+    for name, stats in rows:
+        print(f"{name:<10}{stats['requests']:>7}{stats['throughput_rps']:>9}{stats['p50_ms']:>10}"
+              f"{stats['p95_ms']:>10}{stats['p99_ms']:>10}{stats['error_rate'] * 100:>7.1f}%{stats['throttled']:>6}")
+    seats = report["seats"]
+    print(f"Seat increments: reported {seats['reported_added']}, recorded {seats['recorded_added']}, "
+          f"lost {seats['lost_increments']}")
+    geo = report["geolocation_stub"]
+    print(f"Geolocation stub: {geo['calls']} calls, {geo['failures']} injected failures")
+    for error in report["sample_errors"]:
+        print(f"Error: {error}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the license verification path")
+    parser.add_argument("--url", help="Base URL of the license routes, e.g. http://localhost:8080/api/licenses; "
+                                      "spawns verify_license.py directly when omitted")
+    parser.add_argument("--requests", type=int, default=200, help="Total number of requests")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent requests in flight")
+    parser.add_argument("--mix", default=DEFAULT_MIX,
+                        help=f"Weighted traffic classes: valid, expired, unknown, add-user (default {DEFAULT_MIX})")
+    parser.add_argument("--geo-port", type=int, default=0, help="Port for the geolocation stub (default: random)")
+    parser.add_argument("--geo-latency-ms", type=float, default=50.0, help="Stub response latency")
+    parser.add_argument("--geo-jitter-ms", type=float, default=0.0, help="Uniform +/- jitter on stub latency")
+    parser.add_argument("--geo-failure-rate", type=float, default=0.0, help="Fraction of stub calls answered with 503")
+    parser.add_argument("--geo-country", default="US", help="Country code the stub reports")
+    parser.add_argument("--cache-dir", help="Verifier cache directory (default: a fresh temporary directory, "
+                                            "or LICENSE_CACHE_DIR / server/scripts/cache with --url)")
+    parser.add_argument("--throttle", action="store_true", help="Keep the configured rate limits")
+    parser.add_argument("--seed", type=int, help="Random seed for a reproducible key mix")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    report = run_load(args)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
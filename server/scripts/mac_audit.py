@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""Compliance audit of a device inventory against license MAC allow-lists
+
+Streams an inventory CSV of (hostname, mac) rows in chunks, parses the MACs
+into uint64 arrays and joins them against a sorted array of every licensed
+MAC with searchsorted, so millions of rows are matched without a per-row
+Python lookup.
+
+Usage:
+    python mac_audit.py inventory.csv [--licenses licenses.json] [--json]
+"""
+import sys
+import json
+import argparse
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from bulk_io import DEFAULT_CHUNK_SIZE, iter_csv_chunks
+
+INVENTORY_COLUMNS = {
+    "hostname": ("hostname", "host", "device", "name"),
+    "mac": ("mac", "mac_address", "macaddress"),
+}
+UNAUTHORIZED_SAMPLE_SIZE = 20
+# Longest accepted spelling, 00:11:22:33:44:55
+MAX_MAC_LENGTH = 17
+
+# ASCII byte -> hex digit value, 255 for anything that is not a hex digit
+_HEX_VALUES = np.full(256, 255, dtype=np.uint8)
+for _value, _char in enumerate(b"0123456789ABCDEF"):
+    _HEX_VALUES[_char] = _value
+    _HEX_VALUES[bytes([_char]).lower()[0]] = _value
+_NIBBLE_WEIGHTS = (np.uint64(16) ** np.arange(11, -1, -1, dtype=np.uint64)).astype(np.uint64)
+
+
+def parse_macs(values: Iterable[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """Parse MAC strings into uint64 values
+
+    Accepts colon, dash, dot or no separators in either case. Returns
+    (macs, valid) where invalid entries are 0 and flagged False in valid.
+    """
+    # The array is sized to its longest cell; overlong cells cannot be MACs,
+    # so blank them rather than let one garbage cell inflate the whole chunk
+    cells = [value if len(value) <= MAX_MAC_LENGTH else "" for value in values]
+    raw = np.char.encode(np.asarray(cells, dtype=str), "ascii", "replace")
+    if raw.size == 0:
+        return np.zeros(0, dtype=np.uint64), np.zeros(0, dtype=bool)
+    for separator in (b":", b"-", b"."):
+        raw = np.char.replace(raw, separator, b"")
+    lengths = np.char.str_len(raw)
+
+    digits = _HEX_VALUES[np.frombuffer(raw.astype("S12").tobytes(), dtype=np.uint8).reshape(-1, 12)]
+    valid = (lengths == 12) & (digits != 255).all(axis=1)
+    macs = (digits.astype(np.uint64) * _NIBBLE_WEIGHTS).sum(axis=1, dtype=np.uint64)
+    macs[~valid] = 0
+    return macs, valid
+
+
+def format_mac(value: int) -> str:
+    hex_digits = f"{int(value):012X}"
+    return ":".join(hex_digits[i:i + 2] for i in range(0, 12, 2))
+
+
+class LicensedMacIndex:
+    """Sorted array of every licensed MAC, tagged with the owning license"""
+
+    def __init__(self, licenses: Dict[str, Dict[str, Any]]):
+        self.license_keys = list(licenses)
+        self.max_users = np.array(
+            [licenses[key].get("max_users") or 0 for key in self.license_keys], dtype=np.int64)
+
+        macs, owners = [], []
+        for license_id, key in enumerate(self.license_keys):
+            parsed, valid = parse_macs(licenses[key].get("allowed_macs") or [])
+            macs.append(parsed[valid])
+            owners.append(np.full(int(valid.sum()), license_id, dtype=np.int32))
+        macs = np.concatenate(macs) if macs else np.zeros(0, dtype=np.uint64)
+        owners = np.concatenate(owners) if owners else np.zeros(0, dtype=np.int32)
+
+        # Sort by MAC then license and drop MACs listed twice on one license
+        order = np.lexsort((owners, macs))
+        macs, owners = macs[order], owners[order]
+        keep = np.ones(len(macs), dtype=bool)
+        keep[1:] = (macs[1:] != macs[:-1]) | (owners[1:] != owners[:-1])
+        self.macs = macs[keep]
+        self.owners = owners[keep]
+        self.licensed_macs = np.bincount(self.owners, minlength=len(self.license_keys))
+
+    def match(self, macs: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Join inventory MACs against the index
+
+        Returns (counts, positions, owners): how many licenses list each
+        inventory MAC, and for every (inventory row, license) match the
+        index position and owning license id.
+        """
+        left = np.searchsorted(self.macs, macs, side="left")
+        right = np.searchsorted(self.macs, macs, side="right")
+        counts = right - left
+
+        # Expand rows listed by several licenses into one entry per license
+        total = int(counts.sum())
+        starts = np.repeat(left, counts)
+        offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+        positions = starts + offsets
+        return counts, positions, self.owners[positions]
+
+
+def audit_inventory(inventory_path: str, licenses: Dict[str, Dict[str, Any]],
+                    chunk_size: int = DEFAULT_CHUNK_SIZE) -> Dict[str, Any]:
+    """Match an inventory CSV against every license's allowed MACs"""
+    index = LicensedMacIndex(licenses)
+    license_count = len(index.license_keys)
+    seen = np.zeros(len(index.macs), dtype=bool)
+    authorized_rows = np.zeros(license_count, dtype=np.int64)
+    totals = {"rows": 0, "invalid_mac_rows": 0, "authorized_rows": 0, "unauthorized_rows": 0}
+    unauthorized_sample: List[Dict[str, str]] = []
+
+    for chunk in iter_csv_chunks(inventory_path, INVENTORY_COLUMNS, chunk_size):
+        macs, valid = parse_macs(chunk["mac"])
+        counts, positions, owners = index.match(macs)
+
+        # Drop matches from rows whose MAC failed to parse (parsed as 0)
+        matched = np.repeat(valid, counts)
+        positions, owners = positions[matched], owners[matched]
+        counts[~valid] = 0
+
+        seen[positions] = True
+        authorized_rows += np.bincount(owners, minlength=license_count)
+
+        unauthorized = valid & (counts == 0)
+        totals["rows"] += len(macs)
+        totals["invalid_mac_rows"] += int((~valid).sum())
+        totals["authorized_rows"] += int((counts > 0).sum())
+        totals["unauthorized_rows"] += int(unauthorized.sum())
+
+        for row in np.flatnonzero(unauthorized)[:UNAUTHORIZED_SAMPLE_SIZE - len(unauthorized_sample)]:
+            unauthorized_sample.append({"hostname": chunk["hostname"][row], "mac": format_mac(macs[row])})
+
+    authorized_devices = np.bincount(index.owners[seen], minlength=license_count)
+    over_allocated = np.where(index.max_users > 0, np.maximum(authorized_devices - index.max_users, 0), 0)
+
+    per_license = []
+    for license_id, key in enumerate(index.license_keys):
+        per_license.append({
+            "license_key": key,
+            "max_users": int(index.max_users[license_id]),
+            "licensed_macs": int(index.licensed_macs[license_id]),
+            "authorized_devices": int(authorized_devices[license_id]),
+            "authorized_rows": int(authorized_rows[license_id]),
+            "unused_macs": int(index.licensed_macs[license_id] - authorized_devices[license_id]),
+            "over_allocated": int(over_allocated[license_id]),
+        })
+
+    return {
+        **totals,
+        "licenses": per_license,
+        "over_allocated_licenses": [entry["license_key"] for entry in per_license if entry["over_allocated"]],
+        "unauthorized_sample": unauthorized_sample,
+    }
+
+
+def load_license_export(path: str) -> Dict[str, Dict[str, Any]]:
+    """Read licenses from a JSON export
+
+    Accepts either a {license_key: record} table as used by the verifier or
+    the list returned by GET /api/licenses.
+    """
+    with open(path) as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        return data
+
+    licenses = {}
+    for entry in data:
+        key = entry.get("license_key") or entry.get("id")
+        macs = entry.get("macAddresses")
+        if macs is None:
+            macs = [m.get("mac_address") for m in entry.get("mac_addresses") or []]
+        licenses[key] = {
+            "allowed_macs": macs,
+            "max_users": entry.get("maxUsersAllowed", entry.get("max_users_allowed")),
+        }
+    return licenses
+
+
+def print_report(report: Dict[str, Any]):
+    print(f"Inventory rows: {report['rows']}  authorized: {report['authorized_rows']}  "
+          f"unauthorized: {report['unauthorized_rows']}  invalid MAC: {report['invalid_mac_rows']}")
+    header = f"{'license':<24}{'seats':>7}{'licensed':>10}{'devices':>9}{'unused':>8}{'over':>6}"
+    print(header)
+    print("-" * len(header))
+    for entry in report["licenses"]:
+        print(f"{entry['license_key']:<24}{entry['max_users']:>7}{entry['licensed_macs']:>10}"
+              f"{entry['authorized_devices']:>9}{entry['unused_macs']:>8}{entry['over_allocated']:>6}")
+    for device in report["unauthorized_sample"]:
+        print(f"Unauthorized: {device['hostname']} {device['mac']}")
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Audit a device inventory against license MAC allow-lists")
+    parser.add_argument("inventory", help="CSV with hostname and mac columns")
+    parser.add_argument("--licenses", help="JSON license export (default: the verifier's license table)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="Inventory rows per chunk")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args(argv)
+
+    if args.licenses:
+        licenses = load_license_export(args.licenses)
+    else:
+        from verify_license import LicenseVerifier
+        licenses = LicenseVerifier().get_license_table()
+
+    report = audit_inventory(args.inventory, licenses, args.chunk_size)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
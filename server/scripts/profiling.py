@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+import os
+import io
+import re
+import json
+import time
+import random
+import pstats
+import cProfile
+import datetime
+import logging
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger("LicenseVerifier")
+
+DEFAULT_THRESHOLD_MS = 1000.0
+DEFAULT_MAX_DUMPS = 20
+
+
+class VerificationProfiler:
+    """Captures a profile and check breakdown for slow verifications
+
+    One in every sample_rate calls runs under cProfile. Any call slower than
+    threshold_ms is written to output_dir, with the profile if it was
+    sampled; only the newest max_dumps captures are kept.
+    """
+
+    def __init__(self, output_dir: str, sample_rate: int = 1,
+                 threshold_ms: float = DEFAULT_THRESHOLD_MS, max_dumps: int = DEFAULT_MAX_DUMPS):
+        self.output_dir = output_dir
+        self.sample_rate = max(1, sample_rate)
+        self.threshold_ms = threshold_ms
+        self.max_dumps = max(1, max_dumps)
+
+    @classmethod
+    def from_env(cls, cache_dir: str) -> Optional["VerificationProfiler"]:
+        """Build a profiler from LICENSE_PROFILE ("1" for every call, "N" for one in N)"""
+        setting = os.environ.get("LICENSE_PROFILE", "").strip().lower()
+        if setting in ("", "0", "false", "no", "off"):
+            return None
+        try:
+            sample_rate = 1 if setting in ("true", "yes", "on", "1") else int(setting)
+            threshold_ms = float(os.environ.get("LICENSE_PROFILE_THRESHOLD_MS", DEFAULT_THRESHOLD_MS))
+            max_dumps = int(os.environ.get("LICENSE_PROFILE_MAX_DUMPS", DEFAULT_MAX_DUMPS))
+        except ValueError as e:
+            # A debugging hook must never break verification
+            logger.error(f"Invalid profiling settings, profiling disabled: {e}")
+            return None
+        return cls(os.path.join(cache_dir, "profiles"), sample_rate, threshold_ms, max_dumps)
+
+    def run(self, label: str, func: Callable, *args,
+            breakdown: Optional[Callable[[], Dict[str, Any]]] = None):
+        """Call func(*args), capturing it if it exceeds the latency threshold"""
+        profiler = cProfile.Profile() if random.random() * self.sample_rate < 1 else None
+
+        start = time.perf_counter()
+        if profiler is not None:
+            result = profiler.runcall(func, *args)
+        else:
+            result = func(*args)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+        if elapsed_ms >= self.threshold_ms:
+            try:
+                self._dump(label, elapsed_ms, profiler, breakdown() if breakdown else {})
+            except Exception as e:
+                # Profiling must never fail a verification
+                logger.error(f"Failed to write verification profile: {e}")
+        return result
+
+    def _dump(self, label: str, elapsed_ms: float, profiler: Optional[cProfile.Profile],
+              breakdown: Dict[str, Any]):
+        os.makedirs(self.output_dir, exist_ok=True)
+        stamp = datetime.datetime.now().strftime("%Y%m%dT%H%M%S%f")
+        base = os.path.join(self.output_dir, f"{stamp}_{re.sub(r'[^A-Za-z0-9-]', '_', label)[:64]}")
+
+        report = {
+            "label": label,
+            "elapsed_ms": round(elapsed_ms, 3),
+            "threshold_ms": self.threshold_ms,
+            "checks_ms": breakdown,
+            "profile": None
+        }
+        if profiler is not None:
+            profiler.dump_stats(f"{base}.prof")
+            report["profile"] = os.path.basename(f"{base}.prof")
+            summary = io.StringIO()
+            pstats.Stats(profiler, stream=summary).sort_stats("cumulative").print_stats(25)
+            report["top_functions"] = summary.getvalue()
+
+        with open(f"{base}.json", "w") as f:
+            json.dump(report, f, indent=2)
+        logger.warning(f"Slow verification of {label}: {elapsed_ms:.0f} ms, captured in {base}.json")
+        self._rotate()
+
+    def _rotate(self):
+        """Keep only the newest max_dumps captures"""
+        captures = sorted(
+            (name for name in os.listdir(self.output_dir) if name.endswith(".json")),
+            reverse=True
+        )
+        for name in captures[self.max_dumps:]:
+            base = os.path.join(self.output_dir, name[:-len(".json")])
+            for path in (f"{base}.json", f"{base}.prof"):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
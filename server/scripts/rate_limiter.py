@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+import os
+import json
+import time
+import random
+import sqlite3
+import hashlib
+import logging
+from array import array
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger("LicenseVerifier")
+
+# Requests per minute and burst size for each license tier. Key buckets limit
+# how often one license can be verified, client buckets limit one caller IP.
+DEFAULT_TIER_LIMITS = {
+    "Premium": {"key_per_minute": 120, "client_per_minute": 240, "burst": 20},
+    "Standard": {"key_per_minute": 60, "client_per_minute": 120, "burst": 10},
+    "Basic": {"key_per_minute": 20, "client_per_minute": 60, "burst": 5},
+}
+DEFAULT_LIMIT = DEFAULT_TIER_LIMITS["Basic"]
+
+# Share of acquisitions on the shared store that also sweep idle buckets
+EVICT_PROBABILITY = 0.01
+# Seconds between idle sweeps of the in-memory buckets
+EVICT_INTERVAL = 60.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS buckets (
+    id INTEGER PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS buckets_updated ON buckets (updated);
+"""
+
+
+def load_tier_limits() -> Dict[str, Dict[str, float]]:
+    """Tier limits, overridden per tier by the LICENSE_RATE_LIMITS JSON variable"""
+    limits = {tier: dict(values) for tier, values in DEFAULT_TIER_LIMITS.items()}
+    override = os.environ.get("LICENSE_RATE_LIMITS")
+    if override:
+        try:
+            overrides = json.loads(override)
+            if not isinstance(overrides, dict):
+                raise ValueError("expected an object of tiers")
+            for tier, values in overrides.items():
+                if not isinstance(values, dict):
+                    raise ValueError(f"limits for tier {tier} must be an object")
+                for name, value in values.items():
+                    if isinstance(value, bool) or not isinstance(value, (int, float)):
+                        raise ValueError(f"{tier}.{name} must be a number")
+        except (ValueError, TypeError) as e:
+            logger.error(f"Ignoring invalid LICENSE_RATE_LIMITS: {e}")
+            return limits
+        for tier, values in overrides.items():
+            limits.setdefault(tier, dict(DEFAULT_LIMIT)).update(values)
+    return limits
+
+
+def _bucket_id(name: str, signed: bool = False) -> int:
+    # Buckets are keyed by a 64-bit digest so millions of keys stay compact
+    return int.from_bytes(hashlib.blake2b(name.encode(), digest_size=8).digest(), "little", signed=signed)
+
+
+def _take(tokens: float, updated: float, per_minute: float, burst: float,
+          now: float) -> Tuple[bool, float, float]:
+    """Refill a bucket and try to take a token: (allowed, retry_after, tokens_left)"""
+    rate = per_minute / 60.0
+    tokens = min(burst, tokens + max(0.0, now - updated) * rate)
+    if tokens >= 1.0:
+        return True, 0.0, tokens - 1.0
+    retry_after = (1.0 - tokens) / rate if rate > 0 else float("inf")
+    return False, retry_after, tokens
+
+
+class TokenBucketLimiter:
+    """Token buckets stored in flat arrays indexed by a 64-bit key digest"""
+
+    def __init__(self, idle_timeout: float = 3600.0, evict_interval: float = EVICT_INTERVAL):
+        self.idle_timeout = idle_timeout
+        self.evict_interval = evict_interval
+        self._evicted_at = time.time()
+        self._slots: Dict[int, int] = {}
+        self._ids = array("Q")
+        self._tokens = array("d")
+        self._updated = array("d")
+        self._free = []
+
+    def __len__(self):
+        return len(self._slots)
+
+    def _slot(self, bucket: int, burst: float, now: float) -> int:
+        slot = self._slots.get(bucket)
+        if slot is None:
+            if self._free:
+                slot = self._free.pop()
+                self._ids[slot] = bucket
+                self._tokens[slot] = burst
+                self._updated[slot] = now
+            else:
+                slot = len(self._ids)
+                self._ids.append(bucket)
+                self._tokens.append(burst)
+                self._updated.append(now)
+            self._slots[bucket] = slot
+        return slot
+
+    def acquire(self, name: str, per_minute: float, burst: float,
+                now: Optional[float] = None) -> Tuple[bool, float]:
+        """Take one token from the named bucket
+
+        Returns (allowed, retry_after_seconds).
+        """
+        now = time.time() if now is None else now
+        # Sweeping walks every bucket, so it runs on an interval, not per call
+        if now - self._evicted_at >= self.evict_interval:
+            self.evict_idle(now)
+        slot = self._slot(_bucket_id(name), burst, now)
+        allowed, retry_after, self._tokens[slot] = _take(
+            self._tokens[slot], self._updated[slot], per_minute, burst, now)
+        self._updated[slot] = now
+        return allowed, retry_after
+
+    def evict_idle(self, now: Optional[float] = None) -> int:
+        """Drop buckets that have been idle long enough to be full again"""
+        now = time.time() if now is None else now
+        self._evicted_at = now
+        cutoff = now - self.idle_timeout
+        evicted = 0
+        for bucket, slot in list(self._slots.items()):
+            if self._updated[slot] < cutoff:
+                del self._slots[bucket]
+                self._free.append(slot)
+                evicted += 1
+        return evicted
+
+
+class SharedTokenBucketLimiter:
+    """Token buckets in a SQLite file shared by concurrent verifier processes
+
+    Each acquisition reads and updates its one bucket row inside an
+    immediate transaction, so processes racing on the same bucket are
+    serialized and never overwrite each other's token counts.
+    """
+
+    def __init__(self, path: str, idle_timeout: float = 3600.0, timeout: float = 5.0):
+        self.path = path
+        self.idle_timeout = idle_timeout
+        self.conn = sqlite3.connect(path, timeout=timeout, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(_SCHEMA)
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM buckets").fetchone()[0]
+
+    def acquire(self, name: str, per_minute: float, burst: float,
+                now: Optional[float] = None) -> Tuple[bool, float]:
+        """Take one token from the named bucket
+
+        Returns (allowed, retry_after_seconds).
+        """
+        now = time.time() if now is None else now
+        bucket = _bucket_id(name, signed=True)
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = self.conn.execute("SELECT tokens, updated FROM buckets WHERE id = ?", (bucket,)).fetchone()
+            tokens, updated = row if row else (burst, now)
+            allowed, retry_after, tokens = _take(tokens, updated, per_minute, burst, now)
+            self.conn.execute("INSERT OR REPLACE INTO buckets (id, tokens, updated) VALUES (?, ?, ?)",
+                              (bucket, tokens, now))
+            if random.random() < EVICT_PROBABILITY:
+                self._evict(now)
+            self.conn.execute("COMMIT")
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        return allowed, retry_after
+
+    def _evict(self, now: float) -> int:
+        return self.conn.execute("DELETE FROM buckets WHERE updated < ?", (now - self.idle_timeout,)).rowcount
+
+    def evict_idle(self, now: Optional[float] = None) -> int:
+        """Drop buckets that have been idle long enough to be full again"""
+        with self.conn:
+            return self._evict(time.time() if now is None else now)
+
+    def close(self):
+        self.conn.close()
+
+
+class LicenseRateLimiter:
+    """Per-license-key and per-client throttling with tier-specific limits"""
+
+    def __init__(self, limits: Optional[Dict[str, Dict[str, float]]] = None,
+                 limiter=None):
+        self.limits = limits or load_tier_limits()
+        self.buckets = limiter if limiter is not None else TokenBucketLimiter()
+
+    def check(self, license_key: str, tier: str, client_ip: Optional[str] = None,
+              now: Optional[float] = None) -> Tuple[bool, str, float]:
+        """Return (allowed, reason, retry_after_seconds) for one verification"""
+        limit = self.limits.get(tier, DEFAULT_LIMIT)
+        # One allowance per caller IP, at the rate of the tier being verified
+        burst = limit.get("burst", DEFAULT_LIMIT["burst"])
+
+        if client_ip:
+            allowed, retry_after = self.buckets.acquire(
+                f"client:{client_ip}", limit["client_per_minute"], burst, now)
+            if not allowed:
+                return False, f"Too many verifications from {client_ip}", retry_after
+
+        allowed, retry_after = self.buckets.acquire(
+            f"license:{license_key}", limit["key_per_minute"], burst, now)
+        if not allowed:
+            return False, f"Too many verifications for license {license_key}", retry_after
+
+        return True, "", 0.0
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+import os
+import hmac
+import json
+import time
+import base64
+import hashlib
+import logging
+import secrets
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger("LicenseVerifier")
+
+RECEIPT_VERSION = 1
+DEFAULT_RECEIPT_TTL = 300
+SECRET_FILE_NAME = "receipt.key"
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def load_receipt_secret(cache_dir: str) -> bytes:
+    """Server-side HMAC key from LICENSE_RECEIPT_SECRET or the cache key file
+
+    The key file is created on first use so the Node server and every verifier
+    process on the host sign and validate with the same key.
+    """
+    secret = os.environ.get("LICENSE_RECEIPT_SECRET")
+    if secret:
+        return secret.encode()
+
+    secret_path = os.path.join(cache_dir, SECRET_FILE_NAME)
+    secret = secrets.token_hex(32).encode()
+    try:
+        with open(secret_path, "rb") as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        # e.g. the cache path is not a directory; keep verifying with a local key
+        logger.warning(f"Could not read receipt key, receipts will not outlive this process: {e}")
+        return secret
+
+    try:
+        # O_EXCL so concurrent first runs agree on a single key
+        fd = os.open(secret_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            f.write(secret)
+    except FileExistsError:
+        with open(secret_path, "rb") as f:
+            return f.read().strip()
+    except OSError as e:
+        logger.warning(f"Could not persist receipt key, receipts will not outlive this process: {e}")
+    return secret
+
+
+def _sign(secret: bytes, payload: str) -> str:
+    return _b64encode(hmac.new(secret, payload.encode("utf-8", "surrogateescape"), hashlib.sha256).digest())
+
+
+def issue_receipt(secret: bytes, license_key: str, fingerprint: str, is_valid: bool,
+                  checks: Dict[str, Dict[str, Any]], ttl: int = DEFAULT_RECEIPT_TTL,
+                  now: Optional[float] = None) -> Tuple[str, int]:
+    """Create a signed receipt for a verification result
+
+    Returns (token, expires_at) where expires_at is a Unix timestamp.
+    """
+    issued_at = int(time.time() if now is None else now)
+    claims = {
+        "ver": RECEIPT_VERSION,
+        "key": license_key,
+        "fp": fingerprint,
+        "ok": bool(is_valid),
+        "checks": {name: bool(check.get("valid")) for name, check in checks.items()},
+        "iat": issued_at,
+        "exp": issued_at + ttl,
+    }
+    payload = _b64encode(json.dumps(claims, separators=(",", ":")).encode())
+    return f"{payload}.{_sign(secret, payload)}", claims["exp"]
+
+
+def validate_receipt(secret: bytes, token: str, license_key: Optional[str] = None,
+                     fingerprint: Optional[str] = None,
+                     now: Optional[float] = None) -> Tuple[bool, str, Dict[str, Any]]:
+    """Check a presented receipt without re-running any license checks
+
+    Returns (accepted, reason, claims). A receipt is accepted when its
+    signature is intact, it has not expired and it matches the expected
+    license key and fingerprint (when given). Whether the license itself was
+    valid is reported in claims["ok"].
+    """
+    try:
+        payload, signature = token.split(".")
+    except (AttributeError, ValueError):
+        return False, "Malformed receipt", {}
+
+    # Compare bytes: compare_digest rejects str with non-ASCII characters
+    expected = _sign(secret, payload).encode()
+    if not hmac.compare_digest(signature.encode("utf-8", "surrogateescape"), expected):
+        return False, "Receipt signature is invalid", {}
+
+    try:
+        claims = json.loads(_b64decode(payload))
+    except ValueError:
+        return False, "Malformed receipt", {}
+
+    if claims.get("ver") != RECEIPT_VERSION:
+        return False, "Unsupported receipt version", claims
+    if claims.get("exp", 0) < (time.time() if now is None else now):
+        return False, "Receipt has expired", claims
+    if license_key is not None and claims.get("key") != license_key:
+        return False, "Receipt was issued for a different license", claims
+    if fingerprint is not None and claims.get("fp") != fingerprint:
+        return False, "Receipt was issued for a different device", claims
+    return True, "Receipt accepted", claims
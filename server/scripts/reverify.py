@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+import json
+import time
+import hashlib
+import datetime
+import logging
+from typing import Any, Dict, Optional, Tuple
+
+from license_core import get_local_ip, summarize_checks
+from verify_license import LicenseVerifier
+
+logger = logging.getLogger("LicenseVerifier")
+
+
+def record_version(license_details: Dict[str, Any]) -> str:
+    """Digest of a license record, changes whenever any field changes"""
+    encoded = json.dumps(license_details, sort_keys=True, default=str)
+    return hashlib.sha256(encoded.encode()).hexdigest()[:16]
+
+
+class IncrementalVerifier:
+    """Periodic re-verification that reruns only checks whose inputs changed
+
+    Each check's result is cached together with the inputs it depends on:
+    the date for expiry, the machine fingerprint for MAC, the network address
+    for country and the seat count for user count, plus the license record
+    version for all of them. A repeat call with unchanged inputs reuses the
+    cached result and returns the same structure as verify_license.
+    """
+
+    def __init__(self, verifier: Optional[LicenseVerifier] = None, country_ttl: float = 3600.0):
+        self.verifier = verifier or LicenseVerifier()
+        # Country is also refreshed periodically in case the public IP moved
+        # without the local address changing (e.g. behind NAT or a VPN)
+        self.country_ttl = country_ttl
+        self._cache: Dict[Tuple[str, str], Tuple[tuple, Dict[str, Any]]] = {}
+
+    def check_inputs(self, license_key: str, license_details: Dict[str, Any]) -> Dict[str, tuple]:
+        """Collect the inputs each check depends on"""
+        version = record_version(license_details)
+        country_epoch = int(time.time() // self.country_ttl) if self.country_ttl else 0
+        return {
+            "country": (version, get_local_ip(), country_epoch),
+            "mac": (version, self.verifier.get_fingerprint_digest()),
+            "expiry": (version, datetime.date.today().isoformat()),
+            "user_count": (version, self.verifier.get_user_count(license_key)),
+        }
+
+    def invalidate(self, license_key: Optional[str] = None):
+        """Forget cached results for one license, or for all of them"""
+        if license_key is None:
+            self._cache.clear()
+        else:
+            for cache_key in [k for k in self._cache if k[0] == license_key]:
+                del self._cache[cache_key]
+
+    def verify_license(self, license_key: str, adding_new_user: bool = False) -> Tuple[bool, str, Dict[str, Any]]:
+        """Verify license, reusing cached check results where inputs are unchanged"""
+        verifier = self.verifier
+        rejection = verifier.reject_unknown_key(license_key)
+        if rejection:
+            return False, "Invalid license key", {"license_key": license_key, "error": rejection}
+
+        license_details = verifier.get_license_details(license_key)
+        if not license_details:
+            return False, "Invalid license key", {"license_key": license_key, "error": "License key not found"}
+
+        plan = verifier.get_check_plan(license_details)
+        results = {
+            "license_key": license_key,
+            "tier": license_details.get("tier", "Unknown"),
+            "license_type": plan.license_type,
+            "checks": {},
+            "skipped_checks": list(plan.skipped),
+            "features": license_details.get("features", [])
+        }
+        rechecked = []
+
+        inputs = self.check_inputs(license_key, license_details)
+        for check_name in plan.checks:
+            cached = self._cache.get((license_key, check_name))
+            # Adding a user mutates the seat count, so it always runs
+            mutating = adding_new_user and check_name == "user_count"
+            if cached is not None and cached[0] == inputs[check_name] and not mutating:
+                results["checks"][check_name] = dict(cached[1])
+                continue
+
+            check = verifier.run_check(check_name, license_key, license_details, adding_new_user)
+            results["checks"][check_name] = check
+            rechecked.append(check_name)
+
+            if mutating or check.get("lookup_failed"):
+                # The seat count just changed, or the country lookup failed
+                # transiently; either way the next check recomputes
+                self._cache.pop((license_key, check_name), None)
+            else:
+                self._cache[(license_key, check_name)] = (inputs[check_name], check)
+
+        if rechecked:
+            logger.info(f"Re-verified {license_key}: reran {', '.join(rechecked)}")
+
+        is_valid, summary = summarize_checks(results["checks"])
+        verifier.add_verification_token(results, license_key, is_valid)
+        results["rechecked"] = rechecked
+        return is_valid, summary, results
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+import os
+import json
+import mmap
+import time
+import struct
+import logging
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows; writers are not serialized there
+    fcntl = None
+
+logger = logging.getLogger("LicenseVerifier")
+
+SNAPSHOT_FILE_NAME = "verifier_state.snap"
+
+_MAGIC = b"VKSS"
+_FORMAT_VERSION = 1
+_HEADER = struct.Struct("<4sHI")
+
+
+def file_validity(path: str) -> Dict[str, Any]:
+    """Validity rule tying a section to the current state of a source file"""
+    try:
+        stat = os.stat(path)
+        return {"source": os.path.abspath(path), "mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+    except OSError:
+        return {"source": os.path.abspath(path), "missing": True}
+
+
+class StateSnapshot:
+    """Versioned, memory-mapped file of derived verifier state
+
+    The file holds independent sections (country registry, fingerprint,
+    geolocation, license records), each stored as a JSON blob with the time
+    it was written and the validity rule it was derived under. Readers map
+    the file and decode only the sections they ask for; a stale section is
+    recomputed and rewritten on its own without touching the others.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._map = None
+        self._index: Dict[str, Dict[str, Any]] = {}
+        self._data_offset = 0
+        self._attach()
+
+    def _attach(self):
+        """Map the snapshot file and read its section index"""
+        try:
+            with open(self.path, "rb") as f:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, fmt, index_len = _HEADER.unpack_from(self._map)
+            if magic != _MAGIC or fmt != _FORMAT_VERSION:
+                logger.info(f"Ignoring snapshot {self.path} with unsupported format")
+                self._detach()
+                return
+            self._data_offset = _HEADER.size + index_len
+            self._index = json.loads(self._map[_HEADER.size:self._data_offset])
+        except (FileNotFoundError, ValueError):
+            # Missing, empty or unmappable files simply start a fresh snapshot
+            self._detach()
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable snapshot {self.path}: {e}")
+            self._detach()
+
+    def _detach(self):
+        if self._map is not None:
+            self._map.close()
+        self._map = None
+        self._index = {}
+        self._data_offset = 0
+
+    def _raw(self, name: str) -> bytes:
+        entry = self._index[name]
+        start = self._data_offset + entry["offset"]
+        return self._map[start:start + entry["length"]]
+
+    @contextmanager
+    def _write_lock(self):
+        """Hold an exclusive lock on the snapshot's sidecar lock file"""
+        with open(f"{self.path}.lock", "a") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def get(self, name: str, validity: Optional[Dict[str, Any]] = None,
+            max_age: Optional[float] = None) -> Optional[Any]:
+        """Return a section's payload, or None if it is missing or stale"""
+        entry = self._index.get(name)
+        if entry is None or self._map is None:
+            return None
+        if validity is not None and entry.get("validity") != validity:
+            return None
+        if max_age is not None and time.time() - entry.get("stored_at", 0) > max_age:
+            return None
+        try:
+            return json.loads(self._raw(name))
+        except ValueError:
+            return None
+
+    def put(self, name: str, payload: Any, validity: Optional[Dict[str, Any]] = None):
+        """Replace one section, carrying the other sections over unchanged
+
+        Concurrent writers are serialized, and each merges into the sections
+        on disk at the time it holds the lock rather than those it attached
+        to, so processes filling different sections do not drop each other's.
+        """
+        blob = json.dumps(payload, separators=(",", ":")).encode()
+        try:
+            with self._write_lock():
+                self._detach()
+                self._attach()
+                self._write(name, {"stored_at": time.time(), "validity": validity}, blob)
+        except OSError as e:
+            logger.warning(f"Could not write snapshot {self.path}: {e}")
+        self._detach()
+        self._attach()
+
+    def _write(self, name: str, new_entry: Dict[str, Any], new_blob: bytes):
+        blobs = {}
+        for other in self._index:
+            if other != name:
+                blobs[other] = (self._index[other], self._raw(other))
+        blobs[name] = (new_entry, new_blob)
+
+        index, data, offset = {}, [], 0
+        for section, (entry, blob) in blobs.items():
+            index[section] = {"offset": offset, "length": len(blob),
+                              "stored_at": entry.get("stored_at"), "validity": entry.get("validity")}
+            data.append(blob)
+            offset += len(blob)
+        index_bytes = json.dumps(index, separators=(",", ":")).encode()
+
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(_HEADER.pack(_MAGIC, _FORMAT_VERSION, len(index_bytes)))
+                f.write(index_bytes)
+                for blob in data:
+                    f.write(blob)
+            self._detach()
+            os.replace(tmp_path, self.path)
+        except OSError:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
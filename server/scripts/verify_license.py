@@ -4,10 +4,16 @@ import json
 import os
 import traceback
 import datetime
-import uuid
-import requests
 import logging
 import hashlib
+import sqlite3
+
+from license_core import LicenseVerifierCore
+from profiling import VerificationProfiler
+from license_sync import LicenseStore, default_store_path
+from license_filter import DEFAULT_FP_RATE, DEFAULT_MAX_BYTES, is_well_formed_key, load_or_build
+from rate_limiter import LicenseRateLimiter, SharedTokenBucketLimiter, TokenBucketLimiter
+from receipts import DEFAULT_RECEIPT_TTL, issue_receipt, load_receipt_secret, validate_receipt
 
 # Setup logging
 logging.basicConfig(
@@ -22,106 +28,62 @@ console_handler = logging.StreamHandler()
 console_handler.setLevel(logging.INFO)
 logger.addHandler(console_handler)
 
-class LicenseVerifier:
+class LicenseVerifier(LicenseVerifierCore):
     """Simple license verification for script use"""
     
-    def __init__(self):
+    def __init__(self, key_filter_fp_rate=None, key_filter_max_bytes=None,
+                 rate_limits=None, persist_rate_limits=False, receipt_ttl=None, profiler=None):
         """Initialize the verifier"""
-        self.cache_dir = os.path.join(os.path.dirname(__file__), "cache")
+        super().__init__()
         
-        # Create cache directory if it doesn't exist
-        if not os.path.exists(self.cache_dir):
-            os.makedirs(self.cache_dir)
-    
-    def get_current_country(self):
-        """Get country code from public IP using ipinfo.io"""
-        try:
-            response = requests.get('https://ipinfo.io/json', timeout=5)
-            data = response.json()
-            country = data.get('country', 'Unknown')
-            logger.info(f"Detected country: {country}")
-            return country
-        except Exception as e:
-            logger.error(f"Failed to get country from IP: {e}")
-            return 'Unknown'
-    
-    def get_system_mac(self):
-        """Get system MAC address"""
-        mac = ':'.join(['{:02X}'.format((uuid.getnode() >> ele) & 0xff)
-                     for ele in range(0,8*6,8)][::-1])
-        logger.info(f"System MAC: {mac}")
-        return mac
-    
-    def check_country(self, license_key, allowed_countries):
-        """Check if current country is in allowed countries list"""
-        current_country = self.get_current_country()
+        # Optional slow-verification capture, from LICENSE_PROFILE unless given
+        if profiler is None:
+            profiler = VerificationProfiler.from_env(self.cache_dir)
+        elif profiler is True:
+            profiler = VerificationProfiler(os.path.join(self.cache_dir, "profiles"))
+        self.profiler = profiler or None
         
-        if not allowed_countries:
-            return False, "No allowed countries specified in license"
-            
-        if current_country in allowed_countries:
-            return True, f"Country {current_country} is allowed"
-        else:
-            return False, f"License not valid in {current_country}"
-    
-    def check_mac(self, license_key, allowed_macs):
-        """Check if system MAC matches allowed MACs"""
-        if not allowed_macs:
-            return False, "No MAC addresses specified in license"
-            
-        system_mac = self.get_system_mac()
-        allowed_macs_upper = [m.upper() for m in allowed_macs]
+        # Known-key filter settings, loaded lazily on first verification
+        self.key_filter_fp_rate = key_filter_fp_rate or float(
+            os.environ.get("LICENSE_FILTER_FP_RATE", DEFAULT_FP_RATE))
+        self.key_filter_max_bytes = key_filter_max_bytes or int(
+            os.environ.get("LICENSE_FILTER_MAX_BYTES", DEFAULT_MAX_BYTES))
+        self._key_filter = None
         
-        if system_mac in allowed_macs_upper:
-            return True, f"MAC address {system_mac} is authorized"
-        return False, f"This system's MAC address is not authorized"
-    
-    def check_expiry(self, license_key, expiry_date):
-        """Check if license has expired or is about to expire"""
-        try:
-            today = datetime.date.today()
-            expiry = datetime.datetime.strptime(expiry_date, "%Y-%m-%d").date()
-            days_left = (expiry - today).days
-            
-            if days_left < 0:
-                return False, f"License expired {abs(days_left)} days ago"
-            elif days_left <= 30:
-                return True, f"License expires soon (in {days_left} days). Please renew."
-            else:
-                return True, f"License valid for {days_left} more days"
-        except Exception as e:
-            logger.error(f"Error checking expiry for license {license_key}: {e}")
-            return False, f"Invalid expiry date format"
-    
-    def check_user_count(self, license_key, max_users, adding_new_user=False):
-        """Check and update user count for license"""
-        user_count_file = os.path.join(self.cache_dir, f"user_count_{license_key}.txt")
+        # Throttling state; short-lived processes share it through a locked store
+        self.rate_limits = rate_limits
+        self.persist_rate_limits = persist_rate_limits
+        self.rate_limit_file = os.path.join(self.cache_dir, "rate_limits.sqlite3")
+        self._rate_limiter = None
         
-        try:
-            with open(user_count_file, 'r') as f:
-                current_users = int(f.read().strip())
-        except FileNotFoundError:
-            current_users = 0
+        # Signed verification receipts
+        self.receipt_ttl = receipt_ttl or int(os.environ.get("LICENSE_RECEIPT_TTL", DEFAULT_RECEIPT_TTL))
+        self._receipt_secret = None
         
-        if adding_new_user:
-            if current_users >= max_users:
-                return False, f"User limit reached: {current_users}/{max_users}"
-            else:
-                current_users += 1
-                with open(user_count_file, 'w') as f:
-                    f.write(str(current_users))
-                return True, f"New user added: {current_users}/{max_users}"
-        else:
-            if current_users >= max_users:
-                return False, f"User limit reached: {current_users}/{max_users}"
-            else:
-                return True, f"User count OK: {current_users}/{max_users}"
+        # Licenses synced from the API by license_sync.py replace the demo table
+        store_path = default_store_path(self.cache_dir)
+        self.license_store = LicenseStore(store_path) if os.path.exists(store_path) else None
     
-    def get_license_details(self, license_key):
-        """Get license details - in real implementation, this would query a database"""
+    def get_license_table(self):
+        """Get all license records, from the snapshot when it is current"""
+        if self.license_store is not None:
+            return self.license_store.table()
+        if self.snapshot is None:
+            return self._build_license_table()
+        
+        validity = {"version": self.get_license_table_version()}
+        licenses = self.snapshot.get("license_records", validity)
+        if licenses is None:
+            licenses = self._build_license_table()
+            self.snapshot.put("license_records", licenses, validity)
+        return licenses
+    
+    def _build_license_table(self):
+        """Build all license records - in real implementation, this would query a database"""
         # For demonstration, this uses hardcoded values
-        licenses = {
+        return {
             "PREMIUM-123": {
+                "license_type": "mixed",
                 "allowed_countries": ["US", "IN", "MY", "GB", "CA"],
                 "allowed_macs": [self.get_system_mac()],  # Add current system for demo
                 "expiry_date": "2025-12-31",
@@ -130,6 +92,7 @@ class LicenseVerifier:
                 "features": ["All Features", "Priority Support", "White Labeling"]
             },
             "STANDARD-456": {
+                "license_type": "mixed",
                 "allowed_countries": ["US", "IN"],
                 "allowed_macs": [self.get_system_mac()],
                 "expiry_date": "2025-06-30",
@@ -138,6 +101,7 @@ class LicenseVerifier:
                 "features": ["Basic Features", "Email Support", "API Access"]
             },
             "BASIC-789": {
+                "license_type": "mixed",
                 "allowed_countries": ["US"],
                 "allowed_macs": ["00:11:22:33:44:55"],  # Not matching current system
                 "expiry_date": "2024-12-31",
@@ -146,6 +110,7 @@ class LicenseVerifier:
                 "features": ["Basic Features", "Community Support"]
             },
             "EXPIRED-999": {
+                "license_type": "mixed",
                 "allowed_countries": ["US", "IN", "MY"],
                 "allowed_macs": [self.get_system_mac()],
                 "expiry_date": "2023-01-01",  # Expired
@@ -154,90 +119,152 @@ class LicenseVerifier:
                 "features": ["Basic Features", "Email Support"]
             }
         }
-        
-        # Add current system's license for easy testing of unknown keys
-        if license_key not in licenses:
-            licenses[license_key] = {
-                "allowed_countries": ["US", "IN", "MY"],
-                "allowed_macs": [self.get_system_mac()],
-                "expiry_date": "2025-12-31",
-                "max_users": 10,
-                "tier": "Custom",
-                "features": ["Custom License Features"]
-            }
-            
-        return licenses.get(license_key, {})
     
-    def verify_license(self, license_key, adding_new_user=False):
-        """Verify license and return result"""
-        license_details = self.get_license_details(license_key)
-        
-        results = {
-            "license_key": license_key,
-            "tier": license_details.get("tier", "Unknown"),
-            "checks": {},
-            "features": license_details.get("features", [])
-        }
-        
-        is_valid = True
-        messages = []
-        
-        # Country check
-        country_valid, country_msg = self.check_country(
-            license_key, 
-            license_details.get("allowed_countries", [])
-        )
-        results["checks"]["country"] = {"valid": country_valid, "message": country_msg}
-        if not country_valid:
-            is_valid = False
-            messages.append(country_msg)
-        
-        # MAC check
-        mac_valid, mac_msg = self.check_mac(
+    def get_license_table_version(self):
+        """Identify the current contents of the license table without building it"""
+        if self.license_store is not None:
+            return f"store:{self.license_store.version()}"
+        # The demo table only changes with this file or the machine's MAC
+        source = f"{os.stat(__file__).st_mtime_ns}:{self.get_system_mac()}"
+        return hashlib.sha256(source.encode()).hexdigest()
+    
+    def get_license_details(self, license_key):
+        """Get license details, or an empty dict for unknown keys"""
+        if self.license_store is not None:
+            return self.license_store.get(license_key) or {}
+        return self.get_license_table().get(license_key, {})
+    
+    def get_key_filter(self):
+        """Load the known-key filter, rebuilding it if the license table changed"""
+        if self._key_filter is None:
+            filter_path = os.path.join(self.cache_dir, "known_keys.bloom")
+            table_version = (f"{self.get_license_table_version()}:"
+                             f"{self.key_filter_fp_rate}:{self.key_filter_max_bytes}")
+            self._key_filter = load_or_build(
+                filter_path,
+                lambda: self.get_license_table().keys(),
+                table_version,
+                self.key_filter_fp_rate,
+                self.key_filter_max_bytes
+            )
+        return self._key_filter
+    
+    def reject_unknown_key(self, license_key):
+        """Return a rejection reason for keys that cannot exist, or None"""
+        if not is_well_formed_key(license_key):
+            return "Malformed license key"
+        if license_key not in self.get_key_filter():
+            return "License key not found"
+        return None
+    
+    def get_rate_limiter(self):
+        """Create the rate limiter, on the shared bucket store if enabled"""
+        if self._rate_limiter is None:
+            buckets = None
+            if self.persist_rate_limits:
+                try:
+                    buckets = SharedTokenBucketLimiter(self.rate_limit_file)
+                except sqlite3.Error as e:
+                    logger.warning(f"Could not open rate limit state, limiting in memory: {e}")
+            if buckets is None:
+                buckets = TokenBucketLimiter()
+            self._rate_limiter = LicenseRateLimiter(self.rate_limits, buckets)
+        return self._rate_limiter
+    
+    def check_rate_limit(self, license_key, tier, client_ip=None):
+        """Consume a token for this key and caller"""
+        limiter = self.get_rate_limiter()
+        try:
+            allowed, reason, retry_after = limiter.check(license_key, tier, client_ip)
+        except sqlite3.Error as e:
+            # A stuck shared store must not take verification down with it
+            logger.warning(f"Rate limit check failed, allowing verification: {e}")
+            return True, "", 0.0
+        return allowed, reason, retry_after
+    
+    def get_receipt_secret(self):
+        """Load the HMAC key used to sign verification receipts"""
+        if self._receipt_secret is None:
+            self._receipt_secret = load_receipt_secret(self.cache_dir)
+        return self._receipt_secret
+    
+    def add_verification_token(self, results, license_key, is_valid):
+        """Stamp the results with a signed receipt and verification time"""
+        token, expires_at = issue_receipt(
+            self.get_receipt_secret(),
             license_key,
-            license_details.get("allowed_macs", [])
+            self.get_fingerprint_digest(),
+            is_valid,
+            results["checks"],
+            self.receipt_ttl
         )
-        results["checks"]["mac"] = {"valid": mac_valid, "message": mac_msg}
-        if not mac_valid:
-            is_valid = False
-            messages.append(mac_msg)
-        
-        # Expiry check
-        expiry_valid, expiry_msg = self.check_expiry(
+        results["verification_token"] = token
+        results["verification_token_expires"] = datetime.datetime.fromtimestamp(expires_at).isoformat()
+        results["verification_time"] = datetime.datetime.now().isoformat()
+    
+    def verify_receipt(self, license_key, receipt):
+        """Fast path: accept a previously issued receipt instead of re-verifying"""
+        accepted, reason, claims = validate_receipt(
+            self.get_receipt_secret(),
+            receipt,
             license_key,
-            license_details.get("expiry_date", "2000-01-01")
+            self.get_fingerprint_digest()
         )
-        results["checks"]["expiry"] = {"valid": expiry_valid, "message": expiry_msg}
-        if not expiry_valid:
-            is_valid = False
-            messages.append(expiry_msg)
-        elif "expires soon" in expiry_msg:
-            # Add warning even though license is valid
-            messages.append(expiry_msg)
+        if not accepted:
+            return False, reason, {"license_key": license_key, "status": "invalid", "error": reason}
         
-        # User count check
-        user_valid, user_msg = self.check_user_count(
+        is_valid = claims["ok"]
+        details = {
+            "license_key": license_key,
+            "checks": {name: {"valid": valid} for name, valid in claims["checks"].items()},
+            "verification_token": receipt,
+            "verification_token_expires": datetime.datetime.fromtimestamp(claims["exp"]).isoformat(),
+            "verification_time": datetime.datetime.fromtimestamp(claims["iat"]).isoformat()
+        }
+        summary = "License verification successful" if is_valid else "License verification failed"
+        return is_valid, f"{summary} (from receipt)", details
+    
+    def verify_license(self, license_key, adding_new_user=False, client_ip=None):
+        """Verify license and return result"""
+        if self.profiler is None:
+            return self._verify_license(license_key, adding_new_user, client_ip)
+        return self.profiler.run(
             license_key,
-            license_details.get("max_users", 1),
-            adding_new_user
+            self._verify_license,
+            license_key, adding_new_user, client_ip,
+            breakdown=lambda: dict(self.last_check_timings)
         )
-        results["checks"]["user_count"] = {"valid": user_valid, "message": user_msg}
-        if not user_valid:
-            is_valid = False
-            messages.append(user_msg)
+    
+    def _verify_license(self, license_key, adding_new_user=False, client_ip=None):
+        # Rejected or throttled calls run no checks; don't report the last call's
+        self.last_check_timings = {}
         
-        # Create summary message
-        if is_valid:
-            summary = "License verification successful"
-            if messages:  # Add warnings
-                summary += " with notices: " + "; ".join(messages)
-        else:
-            summary = "License verification failed: " + "; ".join(messages)
+        # Reject impossible keys before any expensive check runs
+        rejection = self.reject_unknown_key(license_key)
+        if rejection:
+            logger.info(f"Rejected license key {license_key!r}: {rejection}")
+            return False, "Invalid license key", {"license_key": license_key, "error": rejection}
         
-        # Add verification token
-        hash_input = f"{license_key}:{is_valid}:{datetime.date.today()}"
-        results["verification_token"] = hashlib.md5(hash_input.encode()).hexdigest()
-        results["verification_time"] = datetime.datetime.now().isoformat()
+        license_details = self.get_license_details(license_key)
+        
+        if not license_details:
+            return False, "Invalid license key", {"license_key": license_key, "error": "License key not found"}
+        
+        # Throttle before running any checks
+        tier = license_details.get("tier", "Unknown")
+        allowed, reason, retry_after = self.check_rate_limit(license_key, tier, client_ip)
+        if not allowed:
+            logger.warning(f"Throttled verification of {license_key}: {reason}")
+            return False, "Verification rate limit exceeded", {
+                "license_key": license_key,
+                "tier": tier,
+                "status": "throttled",
+                "error": reason,
+                "retry_after": round(retry_after, 3)
+            }
+        
+        is_valid, summary, results = self.verify_details(license_key, license_details, adding_new_user)
+        self.add_verification_token(results, license_key, is_valid)
         
         return is_valid, summary, results
 
@@ -258,12 +285,14 @@ def main():
         adding_user = mode.lower() == "add-user"
         
         # Initialize verifier and verify license
-        verifier = LicenseVerifier()
-        valid, message, details = verifier.verify_license(license_key, adding_user)
+        client_ip = sys.argv[3] if len(sys.argv) > 3 else None
+        verifier = LicenseVerifier(persist_rate_limits=True)
+        valid, message, details = verifier.verify_license(license_key, adding_user, client_ip)
         
         # Return JSON result
         print(json.dumps({
             "valid": valid,
+            "status": details.get("status", "valid" if valid else "invalid"),
             "message": message,
             "details": details
         }))